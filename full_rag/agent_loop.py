@@ -0,0 +1,82 @@
+import contextvars
+import time
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from timings import span
+
+BUDGET_NOTE = "Tool budget exhausted. Answer now using FINAL."
+
+
+def parse_tool_calls(text, tools, max_calls=8):
+    # Returns ([(tool, payload), ...], final_answer). Several tool blocks may appear in one response.
+    lines = text.strip().splitlines()
+    calls = []
+    final = None
+    i = 0
+    while i < len(lines):
+        head = lines[i].strip()
+        if head in tools:
+            try:
+                end = lines.index("END", i + 1)
+            except ValueError:
+                break
+            calls.append((head, "\n".join(lines[i + 1 : end]).strip()))
+            i = end + 1
+            continue
+        if head == "FINAL":
+            final = "\n".join(lines[i + 1 :]).strip()
+            break
+        i += 1
+    if not calls and final is None:
+        final = text.strip()
+    return calls[:max_calls], final
+
+
+def run_concurrently(tasks, max_parallel, timeout_s):
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(tasks))), thread_name_prefix="agent-tool")
+    futures = [pool.submit(contextvars.copy_context().run, task) for task in tasks]
+    done, _ = wait(futures, timeout=timeout_s)
+    pool.shutdown(wait=False, cancel_futures=True)
+    outputs = []
+    for future in futures:
+        if future not in done:
+            outputs.append("error: time budget exhausted")
+        elif future.exception() is not None:
+            outputs.append(f"error: {future.exception()}")
+        else:
+            outputs.append(future.result())
+    return outputs
+
+
+def format_steps(steps):
+    blocks = []
+    for number, step in enumerate(steps, 1):
+        for (name, payload, output) in step:
+            blocks.append(f"[step {number}] {name}\n{payload}\n-> {output}")
+    return "\n\n".join(blocks)
+
+
+def run_agent_loop(call_llm, build_prompt, tools, cfg, steps=None, execute=None, deadline=None):
+    # build_prompt(steps, note) returns the next prompt; note is set once the budget is spent.
+    # Pass deadline (a time.monotonic() value) when earlier rounds already used part of the budget.
+    steps = list(steps or [])
+    if execute is None:
+
+        def execute(calls, timeout_s):
+            tasks = [partial(tools[name], payload) for name, payload in calls]
+            return run_concurrently(tasks, cfg.agent_max_parallel, timeout_s)
+
+    if deadline is None:
+        deadline = time.monotonic() + cfg.agent_time_budget_s
+    while len(steps) < cfg.agent_max_steps and time.monotonic() < deadline:
+        response = call_llm(build_prompt(steps, None))
+        calls, final = parse_tool_calls(response, tools, cfg.agent_max_tool_calls)
+        if not calls:
+            return final, steps
+        with span("agent_tools"):
+            outputs = execute(calls, max(0.0, deadline - time.monotonic()))
+        steps.append([(name, payload, output) for (name, payload), output in zip(calls, outputs)])
+    response = call_llm(build_prompt(steps, BUDGET_NOTE))
+    _, final = parse_tool_calls(response, tools, cfg.agent_max_tool_calls)
+    return final if final is not None else response.strip(), steps
@@ -2,21 +2,31 @@ import json
 import os
 import re
 import subprocess
-from datetime import datetime
 from pathlib import Path
 
 from config import default_config
-from power_analysis import run_power_flow, run_time_series_power_flow, save_result
+from power_analysis import (
+    CONTINGENCY_ELEMENTS,
+    run_contingency_analysis,
+    run_power_flow,
+    run_time_series_power_flow,
+    save_contingency_result,
+    save_result,
+)
+from record_store import logs_store
+from timings import collect, record_child, span
 
 
 def _call_llm(prompt):
     script = Path(__file__).parent / "llm_generate.py"
-    result = subprocess.run(
-        [os.environ.get("PYTHON_BIN", "python"), str(script)],
-        input=prompt,
-        text=True,
-        capture_output=True,
-    )
+    with span("llm"):
+        result = subprocess.run(
+            [os.environ.get("PYTHON_BIN", "python"), str(script)],
+            input=prompt,
+            text=True,
+            capture_output=True,
+        )
+    record_child(result.stderr)
     if result.returncode != 0:
         return ""
     return result.stdout.strip()
@@ -55,8 +65,11 @@ def _fallback_params(question):
     match = re.search(r"step[_\s-]*s\s*([0-9]*\.?[0-9]+)", question, re.IGNORECASE)
     if match:
         step_s = float(match.group(1))
+    analysis_type = "power_flow"
+    if re.search(r"contingenc|\bN-1\b|想定事故", question, re.IGNORECASE):
+        analysis_type = "contingency"
     return {
-        "analysis_type": "power_flow",
+        "analysis_type": analysis_type,
         "case": case,
         "load_scale": load_scale,
         "gen_scale": gen_scale,
@@ -70,7 +83,7 @@ def plan_requirements(question):
     prompt = (
         "You are a local analyst. Extract requirements for power analysis.\n"
         "Return JSON only with keys:\n"
-        "analysis_type: \"power_flow\" or \"time_series\"\n"
+        "analysis_type: \"power_flow\", \"time_series\" or \"contingency\" (N-1 outage screening)\n"
         "case: one of case9, case14, case30, case118\n"
         "load_scale: float\n"
         "gen_scale: float\n"
@@ -81,10 +94,12 @@ def plan_requirements(question):
         "Question:\n"
         f"{question}\n"
     )
-    params = _extract_json(_call_llm(prompt))
+    with span("plan"):
+        params = _extract_json(_call_llm(prompt))
     if not params:
         params = _fallback_params(question)
-    if params.get("step_s", 0.0) and params.get("step_s", 1.0) <= 0.1:
+    step_s = params.get("step_s", 0.0)
+    if params.get("analysis_type") != "contingency" and step_s and step_s <= 0.1:
         params["analysis_type"] = "time_series"
     return {
         "analysis_type": params.get("analysis_type", "power_flow"),
@@ -98,18 +113,61 @@ def plan_requirements(question):
 
 
 def _save_log(cfg, payload):
-    cfg.logs_dir.mkdir(parents=True, exist_ok=True)
-    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-    path = cfg.logs_dir / f"log_{stamp}.json"
-    path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
-    return path
+    with span("save_log"):
+        return logs_store(cfg).append({"kind": "log", "case": payload["params"]["case"], **payload})
+
+
+def analyze_question(question, on_saved=None):
+    with collect() as recorder:
+        with span("analyze"):
+            result = _analyze(question, recorder, on_saved)
+    result["timings"] = recorder.as_dict()
+    return result
+
+
+def analyze_contingency(params, question="", elements=CONTINGENCY_ELEMENTS, top=20, on_saved=None, **limits):
+    with collect() as recorder:
+        with span("analyze"):
+            result = _analyze_contingency(
+                default_config(), question, params, recorder, elements, top, limits, on_saved
+            )
+    result["timings"] = recorder.as_dict()
+    return result
+
+
+def _analyze_contingency(
+    cfg, question, params, recorder, elements=CONTINGENCY_ELEMENTS, top=20, limits=None, on_saved=None
+):
+    report = run_contingency_analysis(
+        params["case"],
+        params["load_scale"],
+        params["gen_scale"],
+        elements=elements,
+        workers=cfg.contingency_workers or None,
+        top=top,
+        **(limits or {}),
+    )
+    result_id = save_contingency_result(cfg, question, params, report, on_saved)
+    summary = {key: value for key, value in report.items() if key != "violations"}
+    log_id = _save_log(
+        cfg,
+        {
+            "question": question,
+            "params": params,
+            "summary": summary,
+            "result_id": result_id,
+            "timings": recorder.as_dict(),
+        },
+    )
+    return {"report": report, "result_id": result_id, "log_id": log_id}
 
 
-def analyze_question(question):
+def _analyze(question, recorder, on_saved=None):
     cfg = default_config()
-    cfg.results_dir.mkdir(parents=True, exist_ok=True)
     params = plan_requirements(question)
 
+    if params["analysis_type"] == "contingency":
+        return _analyze_contingency(cfg, question, params, recorder, on_saved=on_saved)
     if params["analysis_type"] == "time_series" and params["duration_s"] > 0:
         summary = run_time_series_power_flow(
             params["case"],
@@ -128,14 +186,15 @@ def analyze_question(question):
         summary = run_power_flow(params["case"], params["load_scale"], params["gen_scale"])
         extra = None
 
-    result_path = save_result(cfg.results_dir, question, params, summary, extra_lines=extra)
+    result_id = save_result(cfg, question, params, summary, extra_lines=extra, on_saved=on_saved)
 
     log_payload = {
         "question": question,
         "params": params,
         "summary": summary,
-        "result_path": str(result_path),
+        "result_id": result_id,
+        "timings": recorder.as_dict(),
     }
-    log_path = _save_log(cfg, log_payload)
+    log_id = _save_log(cfg, log_payload)
 
-    return {"summary": summary, "result_path": str(result_path), "log_path": str(log_path)}
+    return {"summary": summary, "result_id": result_id, "log_id": log_id}
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from generators import CASES, power_scenarios  # noqa: E402
+from power_analysis import run_power_flow, run_power_flow_batch  # noqa: E402
+
+FIELDS = ("total_load_mw", "total_gen_mw", "losses_mw", "vmin_pu", "vmax_pu", "max_line_loading_percent")
+
+
+def max_deviation(batch, reference):
+    worst = {field: 0.0 for field in FIELDS}
+    for got, want in zip(batch, reference):
+        if got["converged"] != want["converged"]:
+            worst["converged"] = 1.0
+            continue
+        for field in FIELDS:
+            if want[field] is not None:
+                worst[field] = max(worst[field], abs(got[field] - want[field]))
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and time the batched power-flow solver.")
+    parser.add_argument("--cases", default=",".join(CASES))
+    parser.add_argument("--scenarios", type=int, default=200)
+    parser.add_argument("--validate", type=int, default=10, help="Scenarios re-solved with run_power_flow.")
+    parser.add_argument("--tolerance", type=float, default=1e-3)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    run_power_flow("case9", 1.0, 1.0)
+    report = []
+    failed = False
+    for case in args.cases.split(","):
+        scenarios = [(s["load_scale"], s["gen_scale"]) for s in power_scenarios(args.scenarios, cases=(case,))]
+        start = time.perf_counter()
+        batch = run_power_flow_batch(case, scenarios)
+        batch_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        reference = [run_power_flow(case, *scenario) for scenario in scenarios[: args.validate]]
+        single_s = (time.perf_counter() - start) / max(1, len(reference))
+
+        deviation = max_deviation(batch, reference)
+        failed = failed or max(deviation.values()) > args.tolerance
+        report.append(
+            {
+                "case": case,
+                "scenarios": len(scenarios),
+                "converged": sum(s["converged"] for s in batch),
+                "batch_s": round(batch_s, 4),
+                "single_s": round(single_s, 4),
+                "equivalent_single_solves": round(batch_s / single_s, 2) if single_s else None,
+                "max_deviation": deviation,
+            }
+        )
+        print(json.dumps(report[-1]), file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+    print(text)
+    if failed:
+        print(f"Batched results deviate from run_power_flow by more than {args.tolerance}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
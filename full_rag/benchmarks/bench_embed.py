@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+import argparse
+import dataclasses
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import default_config  # noqa: E402
+from embedding import BACKENDS, check_parity, load_encoder  # noqa: E402
+from utils import chunk_text, load_texts  # noqa: E402
+
+
+def corpus(cfg, size):
+    chunks = [
+        chunk
+        for _, text in load_texts([cfg.data_dir, cfg.results_dir])
+        for chunk in chunk_text(text, cfg.chunk_size, cfg.chunk_overlap)
+    ]
+    return [chunks[i % len(chunks)] for i in range(size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding throughput and latency per backend.")
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+    parser.add_argument("--model-path", type=Path, help="ONNX export directory (embed_model_path).")
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=0)
+    args = parser.parse_args()
+
+    cfg = dataclasses.replace(
+        default_config(), embed_model_path=args.model_path, embed_threads=args.threads
+    )
+    texts = corpus(cfg, args.texts)
+    for backend in args.backends.split(","):
+        if backend not in BACKENDS:
+            parser.error(f"unknown backend {backend}; choose from {BACKENDS}")
+        start = time.perf_counter()
+        encoder = load_encoder(cfg, backend)
+        load_s = time.perf_counter() - start
+        encoder.encode(texts[:8], show_progress_bar=False)
+
+        start = time.perf_counter()
+        encoder.encode(texts, show_progress_bar=False)
+        batch_s = time.perf_counter() - start
+
+        latencies = []
+        for text in texts[: args.queries]:
+            start = time.perf_counter()
+            encoder.encode([text[:200]], show_progress_bar=False)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+
+        report = {
+            "backend": backend,
+            "load_s": round(load_s, 3),
+            "embeddings_per_s": round(len(texts) / batch_s, 1),
+            "query_p50_ms": round(1000 * latencies[len(latencies) // 2], 2),
+            "query_p95_ms": round(1000 * latencies[int(len(latencies) * 0.95) - 1], 2),
+        }
+        if backend != "torch":
+            report.update(check_parity(cfg, texts[:64], backend=backend))
+        print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from index_store import load_snapshot, write_snapshot_files  # noqa: E402
+
+
+def _memory_kb():
+    usage = {}
+    for path, keys in (("/proc/self/status", ("VmRSS",)), ("/proc/self/smaps_rollup", ("Pss",))):
+        try:
+            for line in Path(path).read_text().splitlines():
+                key = line.split(":")[0]
+                if key in keys:
+                    usage[key.lower() + "_kb"] = int(line.split()[1])
+        except OSError:
+            pass
+    return usage
+
+
+def worker(root, use_mmap, queries):
+    start = time.perf_counter()
+    snapshot = load_snapshot(root, "v000001", use_mmap=use_mmap)
+    load_s = time.perf_counter() - start
+    rng = np.random.default_rng(1)
+    query_vecs = rng.standard_normal((queries, snapshot.index.d)).astype("float32")
+    query_vecs /= np.linalg.norm(query_vecs, axis=1, keepdims=True)
+    start = time.perf_counter()
+    _, ids = snapshot.search(query_vecs, 3)
+    snapshot.records(ids[0])
+    search_s = time.perf_counter() - start
+    print(json.dumps({"load_s": load_s, "first_search_s": search_s, **_memory_kb()}))
+
+
+def make_snapshot(root, rows, dim):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((rows, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    metadata = [{"source": f"doc{i // 10}.md", "chunk": i % 10, "text": "x" * 1500} for i in range(rows)]
+    write_snapshot_files(Path(root) / "v000001", vectors, metadata, {})
+
+
+def run_mode(root, use_mmap, workers, queries):
+    cmd = [sys.executable, __file__, "--worker", root, "--queries", str(queries)]
+    if use_mmap:
+        cmd.append("--mmap")
+    procs = [subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True) for _ in range(workers)]
+    results = [json.loads(p.communicate()[0]) for p in procs]
+    summary = {"mode": "mmap" if use_mmap else "copy", "workers": workers}
+    for key in results[0]:
+        summary[key + "_mean"] = sum(r[key] for r in results) / len(results)
+    summary["pss_kb_total"] = sum(r.get("pss_kb", 0) for r in results)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare copy vs memory-mapped index loading.")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=1)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--mmap", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.mmap, args.queries)
+        return
+
+    with tempfile.TemporaryDirectory() as root:
+        make_snapshot(root, args.rows, args.dim)
+        results = [run_mode(root, use_mmap, args.workers, args.queries) for use_mmap in (False, True)]
+    print(json.dumps({"rows": args.rows, "dim": args.dim, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
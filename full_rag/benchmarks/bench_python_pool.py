@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from python_pool import PythonPool  # noqa: E402
+
+SNIPPET = "import numpy as np\nimport pandas as pd\nprint(pd.Series(np.arange(10)).sum())"
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tool-call round trip: fresh interpreter vs warm pool.")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    pool = PythonPool(size=1, max_uses=args.repeat * 2)
+    pool.run("pass")
+    report = {
+        "subprocess_ms": timed(
+            lambda: subprocess.run([sys.executable, "-c", SNIPPET], capture_output=True, timeout=60), args.repeat
+        ),
+        "pool_ms": timed(lambda: pool.run(SNIPPET), args.repeat),
+    }
+    pool.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from index_store import (  # noqa: E402
+    BINARY_CODES_FILE,
+    CODES_FILE,
+    VECTORS_FILE,
+    load_snapshot,
+    write_snapshot_files,
+)
+
+
+def clustered_vectors(rows, dim, clusters, rng):
+    centers = rng.standard_normal((clusters, dim)).astype("float32")
+    labels = rng.integers(0, clusters, size=rows)
+    vectors = centers[labels] + 0.6 * rng.standard_normal((rows, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and memory of quantized index storage.")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--rescore-factor", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for rows in (int(size) for size in args.sizes.split(",")):
+        data = clustered_vectors(rows + args.queries, args.dim, max(8, rows // 50), rng)
+        vectors, queries = data[:rows], data[rows:]
+        metadata = [{"source": "synthetic", "chunk": i} for i in range(rows)]
+        truth = None
+        for kind in ("none", "fp16", "int8", "binary"):
+            with tempfile.TemporaryDirectory() as root:
+                path = Path(root) / "v1"
+                write_snapshot_files(path, vectors, metadata, {}, kind)
+                snapshot = load_snapshot(root, "v1", rescore_factor=args.rescore_factor)
+                start = time.perf_counter()
+                _, ids = snapshot.search(queries, args.k)
+                elapsed = time.perf_counter() - start
+                resident = {"none": VECTORS_FILE, "binary": BINARY_CODES_FILE}.get(kind, CODES_FILE)
+                index_bytes = (path / resident).stat().st_size
+            if truth is None:
+                truth = ids
+            print(
+                json.dumps(
+                    {
+                        "rows": rows,
+                        "quantization": kind,
+                        "recall_at_k": round(recall_at_k(ids, truth), 4),
+                        "index_ram_bytes": index_bytes,
+                        "ms_per_query": round(1000 * elapsed / len(queries), 3),
+                    }
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
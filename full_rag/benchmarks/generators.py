@@ -0,0 +1,60 @@
+import random
+from pathlib import Path
+
+TOPICS = {
+    "rag": "retrieval augmented generation chunk embedding index vector search context prompt answer",
+    "power": "bus line transformer load generator voltage loading losses slack reactive active flow",
+    "ops": "server worker latency throughput cache memory disk snapshot shard queue request",
+}
+JAPANESE = ["電力潮流", "電圧", "送電線", "負荷", "発電機", "検索", "埋め込み", "文脈", "回答"]
+CASES = ("case9", "case14", "case30", "case118")
+
+
+def _sentence(rng, vocab, japanese_ratio):
+    if rng.random() < japanese_ratio:
+        return "".join(rng.choice(JAPANESE) for _ in range(rng.randint(4, 12))) + "。"
+    words = [rng.choice(vocab) for _ in range(rng.randint(6, 18))]
+    return " ".join(words).capitalize() + "."
+
+
+def synthetic_document(rng, words, japanese_ratio=0.1):
+    topic = rng.choice(sorted(TOPICS))
+    vocab = TOPICS[topic].split()
+    lines = [f"# Synthetic {topic} note", ""]
+    count = 0
+    while count < words:
+        sentence = _sentence(rng, vocab, japanese_ratio)
+        lines.append(sentence)
+        count += max(1, len(sentence.split()))
+    return "\n".join(lines) + "\n"
+
+
+def synthetic_corpus(out_dir, docs, words_per_doc=300, seed=0, japanese_ratio=0.1):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    for i in range(docs):
+        text = synthetic_document(rng, words_per_doc, japanese_ratio)
+        (out_dir / f"synthetic_{i:06d}.md").write_text(text, encoding="utf-8")
+    return out_dir
+
+
+def synthetic_queries(count, seed=0):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        vocab = TOPICS[rng.choice(sorted(TOPICS))].split()
+        queries.append(" ".join(rng.choice(vocab) for _ in range(rng.randint(3, 8))))
+    return queries
+
+
+def power_scenarios(count, cases=CASES, seed=0, load_range=(0.8, 1.3), gen_range=(0.9, 1.1)):
+    rng = random.Random(seed)
+    return [
+        {
+            "case": cases[i % len(cases)],
+            "load_scale": round(rng.uniform(*load_range), 3),
+            "gen_scale": round(rng.uniform(*gen_range), 3),
+        }
+        for i in range(count)
+    ]
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import dataclasses
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+REQUESTS = {
+    "dry_run": {"question": "case14, load_scale 1.2, step_s 0.1, duration_s 10", "dry_run": True},
+    "power_flow": {"question": "Run a {case} power flow with load_scale 1.2 and summarize."},
+    "time_series": {
+        "question": "Run a {case} time series with load_scale 1.1, duration_s {duration}, step_s 0.1"
+    },
+}
+
+
+def stub_llm(latency_s):
+    import analysis_pipeline
+
+    def call(prompt):
+        time.sleep(latency_s)
+        question = prompt.split("Question:\n", 1)[-1].strip()
+        params = analysis_pipeline._fallback_params(question)
+        params["note"] = "stub"
+        return json.dumps(params)
+
+    return call
+
+
+def install_stub(latency_s, work_dir):
+    import analysis_pipeline
+    import config
+    import server
+
+    os.environ.setdefault("LLAMA_MODEL_PATH", "stub")
+    os.environ.setdefault("NO_INDEX_WATCH", "1")
+    base = config.default_config()
+    run_cfg = dataclasses.replace(
+        base,
+        results_dir=work_dir / "results",
+        logs_dir=work_dir / "logs",
+        store_dir=work_dir / "store",
+        snapshots_dir=work_dir / "snapshots",
+        index_path=work_dir / "index.faiss",
+        metadata_path=work_dir / "metadata.json",
+    )
+    analysis_pipeline.default_config = lambda: run_cfg
+    analysis_pipeline._call_llm = stub_llm(latency_s)
+    # Stub results must not reach the real index, and embedding them would skew the latencies.
+    server.index_result = None
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in REQUESTS:
+            raise SystemExit(f"Unknown request type {name}; choose from {sorted(REQUESTS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(pct / 100 * len(values))) - 1))
+    return round(values[index] * 1000, 2)
+
+
+def summarize(samples, elapsed):
+    latencies = [s["latency_s"] for s in samples]
+    errors = [s for s in samples if s["status"] != 200]
+    summary = {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(len(errors) / len(samples), 4) if samples else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+    }
+    if errors:
+        summary["status_codes"] = sorted({s["status"] for s in errors})
+    return summary
+
+
+async def drive(client, args, mix):
+    rng = random.Random(args.seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=args.requests)
+    queue = asyncio.Queue()
+    for kind in kinds:
+        queue.put_nowait(kind)
+    samples = []
+
+    async def worker():
+        while True:
+            try:
+                kind = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            body = dict(REQUESTS[kind])
+            body["question"] = body["question"].format(case=args.case, duration=args.duration_s)
+            start = time.perf_counter()
+            try:
+                response = await client.post("/analyze", json=body, timeout=args.timeout_s)
+                status = response.status_code
+            except Exception:
+                status = 0
+            samples.append({"kind": kind, "status": status, "latency_s": time.perf_counter() - start})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return samples, time.perf_counter() - start
+
+
+def start_local_server(app, host="127.0.0.1"):
+    import uvicorn
+
+    from start_server import find_free_port
+
+    port = find_free_port(host, 8100)
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://{host}:{port}"
+
+
+async def run(args, mix):
+    import httpx
+
+    from server import app
+
+    if args.mode == "port":
+        server, base_url = start_local_server(app)
+        try:
+            async with httpx.AsyncClient(base_url=base_url) as client:
+                return await drive(client, args, mix)
+        finally:
+            server.should_exit = True
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            return await drive(client, args, mix)
+
+
+def main():
+    import record_store
+
+    parser = argparse.ArgumentParser(description="Load-test /analyze with a stub LLM.")
+    parser.add_argument("--mode", choices=["inprocess", "port"], default="inprocess")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--mix", default="dry_run=1,power_flow=2,time_series=1")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--case", default="case14")
+    parser.add_argument("--duration-s", type=float, default=0.5, help="time_series request length.")
+    parser.add_argument("--timeout-s", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        install_stub(args.llm_latency_ms / 1000, Path(work_dir))
+        samples, elapsed = asyncio.run(run(args, mix))
+        record_store.close_stores()
+
+    report = {
+        "config": {
+            "mode": args.mode,
+            "concurrency": args.concurrency,
+            "mix": mix,
+            "llm_latency_ms": args.llm_latency_ms,
+            "case": args.case,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "overall": summarize(samples, elapsed),
+        "by_kind": {kind: summarize([s for s in samples if s["kind"] == kind], elapsed) for kind in mix},
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
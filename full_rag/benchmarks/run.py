@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+import argparse
+import dataclasses
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import default_config  # noqa: E402
+from embedding import encode_queries, iter_chunks, load_encoder  # noqa: E402
+from generators import power_scenarios, synthetic_corpus, synthetic_document, synthetic_queries  # noqa: E402
+from index_store import build_snapshot, open_index, publish_snapshot  # noqa: E402
+from utils import chunk_text  # noqa: E402
+
+SIZES = {
+    "full": {
+        "chunk_text": [10_000, 100_000, 1_000_000],
+        "ingest": [20, 200, 1000],
+        "power_flow": ["case9", "case30", "case118"],
+        "time_series": [5, 20],
+    },
+    "quick": {
+        "chunk_text": [10_000, 100_000],
+        "ingest": [20, 100],
+        "power_flow": ["case9", "case30"],
+        "time_series": [5],
+    },
+}
+
+
+def measure(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {"median_s": statistics.median(samples), "min_s": min(samples)}
+
+
+def bench_chunk_text(cfg, sizes, repeat):
+    encoder = load_encoder(cfg)
+    for words in sizes:
+        text = synthetic_document(random.Random(words), words)
+        stats = measure(lambda: chunk_text(text, cfg.chunk_size, cfg.chunk_overlap), repeat)
+        yield {"component": "chunk_text", "size": words, "unit": "words", **stats}
+        stats = measure(lambda: list(iter_chunks(cfg, encoder, [("doc", text)])), repeat)
+        yield {"component": "chunk_tokens", "size": words, "unit": "words", **stats}
+
+
+def bench_ingest_and_retrieval(cfg, sizes, repeat, queries):
+    encoder = load_encoder(cfg)
+    query_texts = synthetic_queries(queries)
+    for docs in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            run_cfg = dataclasses.replace(
+                cfg,
+                data_dir=synthetic_corpus(tmp / "data", docs),
+                results_dir=tmp / "results",
+                index_path=tmp / "index.faiss",
+                metadata_path=tmp / "metadata.json",
+                snapshots_dir=tmp / "snapshots",
+                store_dir=tmp / "store",
+            )
+            stats = measure(lambda: publish_snapshot(run_cfg, build_snapshot(run_cfg, encoder)), repeat)
+            yield {"component": "ingest", "size": docs, "unit": "docs", **stats}
+
+            index = open_index(run_cfg)
+
+            def retrieve():
+                for query in query_texts:
+                    index.search(encode_queries(encoder, [query]), run_cfg.top_k)
+
+            stats = measure(retrieve, repeat)
+            index.close()
+            stats = {key: value / len(query_texts) for key, value in stats.items()}
+            yield {"component": "retrieval_per_query", "size": docs, "unit": "docs", **stats}
+
+
+def bench_power(sizes, steps_list, repeat):
+    from power_analysis import run_power_flow, run_power_flow_batch, run_time_series_power_flow
+
+    run_power_flow("case9", 1.0, 1.0)
+    for case in sizes:
+        scenario = power_scenarios(1, cases=(case,))[0]
+        stats = measure(
+            lambda: run_power_flow(scenario["case"], scenario["load_scale"], scenario["gen_scale"]), repeat
+        )
+        yield {"component": "run_power_flow", "size": case, "unit": "case", **stats}
+        scenarios = [(s["load_scale"], s["gen_scale"]) for s in power_scenarios(100, cases=(case,))]
+        stats = measure(lambda: run_power_flow_batch(case, scenarios), repeat)
+        yield {"component": "run_power_flow_batch_100", "size": case, "unit": "case", **stats}
+    for steps in steps_list:
+        duration = round((steps - 1) * 0.1, 6)
+        stats = measure(lambda: run_time_series_power_flow("case14", 1.0, 1.0, duration, 0.1), repeat)
+        yield {"component": "run_time_series_power_flow", "size": steps, "unit": "steps", **stats}
+
+
+def compare(results, baseline, tolerance, min_delta_s):
+    previous = {(r["component"], str(r["size"])): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        base = previous.get((result["component"], str(result["size"])))
+        if base is None:
+            continue
+        ratio = result["median_s"] / base["median_s"] if base["median_s"] else float("inf")
+        result["baseline_median_s"] = base["median_s"]
+        result["ratio"] = round(ratio, 3)
+        if ratio > 1 + tolerance and result["median_s"] - base["median_s"] > min_delta_s:
+            regressions.append(result)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Component benchmarks for full_rag.")
+    parser.add_argument("--profile", choices=sorted(SIZES), default="full")
+    parser.add_argument("--components", default="chunk_text,ingest,power")
+    parser.add_argument("--encoder", default="hash", help="embed_backend to use (hash runs offline).")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--output", type=Path, help="Write results JSON here.")
+    parser.add_argument("--baseline", type=Path, help="Compare against a previous results JSON.")
+    parser.add_argument("--save-baseline", action="store_true", help="Write results to --baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown ratio.")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    cfg = dataclasses.replace(default_config(), embed_backend=args.encoder)
+    sizes = SIZES[args.profile]
+    components = set(args.components.split(","))
+    results = []
+
+    def emit(rows):
+        for row in rows:
+            print(json.dumps(row), file=sys.stderr)
+            results.append(row)
+
+    if "chunk_text" in components:
+        emit(bench_chunk_text(cfg, sizes["chunk_text"], args.repeat))
+    if "ingest" in components:
+        emit(bench_ingest_and_retrieval(cfg, sizes["ingest"], args.repeat, args.queries))
+    if "power" in components:
+        emit(bench_power(sizes["power_flow"], sizes["time_series"], args.repeat))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().strftime("%Y%m%dT%H%M%SZ"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "profile": args.profile,
+            "encoder": args.encoder,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+    regressions = []
+    if args.baseline and args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+    elif args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms / 1000)
+        report["regressions"] = [f"{r['component']}:{r['size']} x{r['ratio']}" for r in regressions]
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+    print(text)
+    if regressions:
+        print("Regressions: " + ", ".join(report["regressions"]), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional, Tuple
 
 
 @dataclass(frozen=True)
@@ -9,10 +10,41 @@ class RagConfig:
     logs_dir: Path
     index_path: Path
     metadata_path: Path
+    snapshots_dir: Path
+    store_dir: Path
     chunk_size: int = 400
     chunk_overlap: int = 60
+    chunk_by: str = "tokens"
+    chunk_tokens: int = 240
+    chunk_overlap_tokens: int = 32
     embed_model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
+    embed_backend: str = "torch"
+    embed_model_path: Optional[Path] = None
+    embed_batch_size: int = 32
+    embed_max_length: int = 256
+    embed_threads: int = 0
     top_k: int = 3
+    refresh_interval_s: float = 5.0
+    keep_snapshots: int = 2
+    index_mmap: bool = True
+    index_quantization: str = "none"
+    rescore_factor: int = 8
+    shard_by: str = "none"
+    hash_shards: int = 4
+    search_threads: int = 4
+    store_segment_bytes: int = 64 * 1024 * 1024
+    store_batch_size: int = 64
+    store_flush_interval_s: float = 0.2
+    contingency_workers: int = 0
+    python_pool_size: int = 2
+    python_max_uses: int = 50
+    python_timeout_s: float = 10.0
+    python_memory_mb: int = 1024
+    python_preload: Tuple[str, ...] = ("numpy", "pandas")
+    agent_max_steps: int = 4
+    agent_time_budget_s: float = 120.0
+    agent_max_tool_calls: int = 8
+    agent_max_parallel: int = 4
 
 
 def default_config() -> RagConfig:
@@ -23,4 +55,6 @@ def default_config() -> RagConfig:
         logs_dir=base / "logs",
         index_path=base / "index.faiss",
         metadata_path=base / "metadata.json",
+        snapshots_dir=base / "snapshots",
+        store_dir=base / "store",
     )
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+import argparse
+import inspect
+import re
+import sys
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from config import default_config
+from timings import span
+from utils import iter_token_chunks, iter_word_chunks, regex_token_offsets
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8", "hash")
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model_int8.onnx"}
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype="float32")
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+class OnnxEncoder:
+    def __init__(self, model_dir, onnx_file, batch_size=32, max_length=256, threads=0):
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except Exception as exc:
+            raise RuntimeError(f"ONNX backend requires onnxruntime and transformers: {exc}") from exc
+
+        model_dir = Path(model_dir)
+        if not (model_dir / onnx_file).exists():
+            raise RuntimeError(
+                f"{model_dir / onnx_file} not found. Run: python embedding.py export {model_dir}"
+            )
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            str(model_dir / onnx_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self._input_names = {item.name for item in self.session.get_inputs()}
+        self._dimension = self.session.get_outputs()[0].shape[-1]
+
+    def get_sentence_embedding_dimension(self):
+        return self._dimension
+
+    def encode(self, texts, show_progress_bar=False):
+        if isinstance(texts, str):
+            texts = [texts]
+        # Sorting by length keeps padding (and wasted compute) per batch small.
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        pooled = np.zeros((len(texts), self._dimension), dtype="float32")
+        for start in range(0, len(order), self.batch_size):
+            rows = order[start : start + self.batch_size]
+            tokens = self.tokenizer(
+                [texts[i] for i in rows],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            feeds = {name: value.astype("int64") for name, value in tokens.items() if name in self._input_names}
+            hidden = self.session.run(None, feeds)[0]
+            mask = tokens["attention_mask"][..., None].astype("float32")
+            pooled[rows] = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return _normalize(pooled)
+
+
+class HashEncoder:
+    # Deterministic, model-free stand-in for offline benchmarks and smoke runs.
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, texts, show_progress_bar=False):
+        if isinstance(texts, str):
+            texts = [texts]
+        vectors = np.zeros((len(texts), self.dimension), dtype="float32")
+        for row, text in enumerate(texts):
+            for token in re.findall(r"\w+", text.lower()):
+                digest = zlib.crc32(token.encode("utf-8"))
+                vectors[row, digest % self.dimension] += 1.0 if digest & 0x80000000 else -1.0
+        return _normalize(vectors)
+
+
+def load_encoder(cfg, backend=None):
+    with span("embed_load"):
+        return _load_encoder(cfg, backend or cfg.embed_backend)
+
+
+def encode_queries(encoder, queries):
+    with span("encode"):
+        return _normalize(encoder.encode(queries, show_progress_bar=False))
+
+
+def token_offsets_fn(encoder):
+    tokenizer = getattr(encoder, "tokenizer", None)
+    if tokenizer is None or not getattr(tokenizer, "is_fast", False):
+        return regex_token_offsets
+
+    def token_offsets(texts):
+        tokens = tokenizer(list(texts), add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        return tokens["offset_mapping"]
+
+    return token_offsets
+
+
+def iter_chunks(cfg, encoder, documents):
+    if cfg.chunk_by == "words":
+        return iter_word_chunks(documents, cfg.chunk_size, cfg.chunk_overlap)
+    if cfg.chunk_by != "tokens":
+        raise ValueError(f"Unsupported chunk_by: {cfg.chunk_by}")
+    return iter_token_chunks(
+        documents, token_offsets_fn(encoder), cfg.chunk_tokens, cfg.chunk_overlap_tokens, cfg.embed_batch_size
+    )
+
+
+def _load_encoder(cfg, backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported embed_backend: {backend}")
+    if backend == "hash":
+        return HashEncoder()
+    if backend.startswith("onnx"):
+        if cfg.embed_model_path is None:
+            raise ValueError(f"embed_model_path must be set for the {backend} backend")
+        return OnnxEncoder(
+            cfg.embed_model_path,
+            ONNX_FILES[backend],
+            batch_size=cfg.embed_batch_size,
+            max_length=cfg.embed_max_length,
+            threads=cfg.embed_threads,
+        )
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if cfg.embed_threads:
+        torch.set_num_threads(cfg.embed_threads)
+    model = SentenceTransformer(cfg.embed_model_name, device="cpu")
+    model.max_seq_length = min(model.max_seq_length or cfg.embed_max_length, cfg.embed_max_length)
+    if backend == "torch-int8":
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def export_onnx(model_name, out_dir, int8=True):
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic = {name: {0: "batch", 1: "sequence"} for name in names}
+    dynamic["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    options = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        options["dynamo"] = False
+    torch.onnx.export(
+        model,
+        tuple(sample[name] for name in names),
+        str(out_dir / ONNX_FILES["onnx"]),
+        input_names=names,
+        output_names=["last_hidden_state"],
+        dynamic_axes=dynamic,
+        opset_version=14,
+        **options,
+    )
+    tokenizer.save_pretrained(str(out_dir))
+    if int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(
+            str(out_dir / ONNX_FILES["onnx"]),
+            str(out_dir / ONNX_FILES["onnx-int8"]),
+            weight_type=QuantType.QInt8,
+        )
+    return out_dir
+
+
+def check_parity(cfg, texts, backend=None, reference="torch"):
+    expected = _normalize(load_encoder(cfg, reference).encode(texts, show_progress_bar=False))
+    actual = _normalize(load_encoder(cfg, backend).encode(texts, show_progress_bar=False))
+    cosine = (expected * actual).sum(axis=1)
+    return {"min_cosine": float(cosine.min()), "mean_cosine": float(cosine.mean()), "texts": len(texts)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding backend tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Export the embedding model to ONNX (plus an int8 variant).")
+    export.add_argument("out_dir", type=Path)
+    export.add_argument("--no-int8", action="store_true")
+    parity = sub.add_parser("parity", help="Compare a backend against the PyTorch reference.")
+    parity.add_argument("--backend", choices=BACKENDS)
+    parity.add_argument("--threshold", type=float, default=0.99)
+    args = parser.parse_args()
+
+    cfg = default_config()
+    if args.command == "export":
+        print(f"Exported to {export_onnx(cfg.embed_model_name, args.out_dir, int8=not args.no_int8)}")
+        return
+
+    from utils import chunk_text, load_texts
+
+    texts = [
+        chunk
+        for _, text in load_texts([cfg.data_dir, cfg.results_dir])
+        for chunk in chunk_text(text, cfg.chunk_size, cfg.chunk_overlap)
+    ]
+    report = check_parity(cfg, texts, backend=args.backend)
+    print(report)
+    if report["min_cosine"] < args.threshold:
+        print(f"Parity check failed: min cosine below {args.threshold}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,825 @@
+import contextvars
+import fcntl
+import heapq
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from embedding import iter_chunks
+from record_store import results_store
+from timings import span
+from utils import (
+    byte_offsets,
+    iter_source_files,
+    load_metadata,
+    save_metadata,
+    write_text_atomic,
+)
+
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+VECTORS_FILE = "vectors.npy"
+METADATA_FILE = "metadata.jsonl"
+OFFSETS_FILE = "metadata.offsets.npy"
+MANIFEST_FILE = "manifest.json"
+TEXTS_FILE = "texts.bin"
+SPANS_FILE = "spans.npy"
+STORE_KEY = "@results_store"
+CHUNKER_KEY = "@chunker"
+DELTA_FILE = "delta.wal"
+_FRAME = struct.Struct("<II")
+CODES_FILE = "codes.faiss"
+BINARY_CODES_FILE = "codes.binary.faiss"
+QUANTIZERS = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+
+def _mmap_file(path):
+    handle = open(path, "rb")
+    size = os.fstat(handle.fileno()).st_size
+    return handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+
+class MmapMetadata:
+    def __init__(self, data_path, offsets_path):
+        self._offsets = np.load(offsets_path, mmap_mode="r")
+        self._file, self._data = _mmap_file(data_path)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return json.loads(self._data[start:end])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class ChunkTexts:
+    # Chunk text lives once in a packed UTF-8 blob; rows only keep byte spans into it.
+    def __init__(self, data, spans):
+        self.data = data
+        self.spans = spans
+
+    @classmethod
+    def load(cls, data_path, spans_path, use_mmap=True):
+        if use_mmap:
+            handle, data = _mmap_file(data_path)
+            texts = cls(data, np.load(spans_path, mmap_mode="r"))
+            texts._file = handle
+            return texts
+        return cls(Path(data_path).read_bytes(), np.load(spans_path))
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __getitem__(self, i):
+        start, end = self.spans[i]
+        return bytes(self.data[int(start) : int(end)]).decode("utf-8")
+
+
+class MmapFlatIndex:
+    def __init__(self, vectors, block_rows=65536):
+        self.vectors = vectors
+        self.d = vectors.shape[1]
+        self.ntotal = vectors.shape[0]
+        self.block_rows = block_rows
+
+    def search(self, query_vecs, k):
+        n_queries = query_vecs.shape[0]
+        best_scores = np.full((n_queries, k), -np.inf, dtype="float32")
+        best_ids = np.full((n_queries, k), -1, dtype="int64")
+        for start in range(0, self.ntotal, self.block_rows):
+            block = np.asarray(self.vectors[start : start + self.block_rows])
+            scores = np.concatenate([best_scores, query_vecs @ block.T], axis=1)
+            ids = np.concatenate(
+                [best_ids, np.broadcast_to(np.arange(start, start + len(block)), (n_queries, len(block)))],
+                axis=1,
+            )
+            keep = min(k, scores.shape[1])
+            top = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_ids = np.take_along_axis(ids, top, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        scores = np.take_along_axis(best_scores, order, axis=1)
+        ids = np.take_along_axis(best_ids, order, axis=1)
+        ids[~np.isfinite(scores)] = -1
+        return scores, ids
+
+
+class RescoringIndex:
+    def __init__(self, codes, vectors, rescore_factor=8):
+        self.codes = codes
+        self.vectors = vectors
+        self.binary = isinstance(codes, faiss.IndexBinary)
+        self.d = vectors.shape[1]
+        self.ntotal = vectors.shape[0]
+        self.rescore_factor = rescore_factor
+
+    def search(self, query_vecs, k):
+        n_candidates = min(self.ntotal, k * self.rescore_factor)
+        scores = np.full((len(query_vecs), k), -np.inf, dtype="float32")
+        ids = np.full((len(query_vecs), k), -1, dtype="int64")
+        if n_candidates == 0:
+            return scores, ids
+        if self.binary:
+            _, candidates = self.codes.search(binary_codes(query_vecs), n_candidates)
+        else:
+            _, candidates = self.codes.search(query_vecs, n_candidates)
+        for row, (query, cand) in enumerate(zip(query_vecs, candidates)):
+            cand = np.sort(cand[cand != -1])
+            exact = np.asarray(self.vectors[cand]) @ query
+            top = np.argsort(-exact, kind="stable")[:k]
+            scores[row, : len(top)] = exact[top]
+            ids[row, : len(top)] = cand[top]
+        return scores, ids
+
+
+def binary_codes(vectors):
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+def quantized_index(vectors, kind):
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    if kind == "binary":
+        index = faiss.IndexBinaryFlat(vectors.shape[1])
+        index.add(binary_codes(vectors))
+        return index
+    if kind not in QUANTIZERS:
+        raise ValueError(f"Unsupported index_quantization: {kind}")
+    index = faiss.IndexScalarQuantizer(vectors.shape[1], QUANTIZERS[kind], faiss.METRIC_INNER_PRODUCT)
+    if len(vectors):
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def flat_index(vectors):
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(np.ascontiguousarray(vectors, dtype="float32"))
+    return index
+
+
+class Delta:
+    # Chunks appended to a published snapshot through its write-ahead log.
+    def __init__(self, vectors, metadata, texts):
+        self.vectors = vectors
+        self.metadata = metadata
+        self.texts = texts
+
+
+class Snapshot:
+    def __init__(self, version, vectors, metadata, manifest=None, index=None, texts=None, path=None):
+        self.version = version
+        self.vectors = vectors
+        self.index = index if index is not None else flat_index(vectors)
+        self.metadata = metadata
+        self.manifest = manifest or {}
+        self.texts = texts
+        self.path = path
+        self.delta = None
+        self._delta_offset = 0
+        self._delta_lock = threading.Lock()
+        self.readers = 0
+
+    def search(self, query_vecs, k):
+        scores, ids = self.index.search(query_vecs, k)
+        delta = self.delta
+        if delta is None:
+            return scores, ids
+        extra = query_vecs @ delta.vectors.T
+        scores = np.concatenate([scores, extra], axis=1)
+        extra_ids = np.arange(len(delta.vectors)) + len(self.metadata)
+        ids = np.concatenate([ids, np.broadcast_to(extra_ids, extra.shape)], axis=1)
+        scores[ids == -1] = -np.inf
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        scores = np.take_along_axis(scores, order, axis=1)
+        ids = np.take_along_axis(ids, order, axis=1)
+        ids[~np.isfinite(scores)] = -1
+        return scores, ids
+
+    def record(self, i):
+        if i >= len(self.metadata):
+            j = i - len(self.metadata)
+            return dict(self.delta.metadata[j], text=self.delta.texts[j])
+        if self.texts is None:
+            return self.metadata[i]
+        return dict(self.metadata[i], text=self.texts[i])
+
+    def records(self, ids):
+        return [self.record(i) for i in ids if i != -1]
+
+    def load_delta(self):
+        if self.path is None:
+            return False
+        with self._delta_lock:
+            offset, frames = self._delta_offset, []
+            for offset, frame in read_delta(self.path / DELTA_FILE, offset):
+                # A record logged just before this snapshot was built is already in it.
+                if frame["rowid"] > self.manifest.get(STORE_KEY, 0):
+                    frames.append(frame)
+            self._delta_offset = offset
+            if not frames:
+                return False
+            delta = self.delta or Delta(np.zeros((0, self.vectors.shape[1]), dtype="float32"), [], [])
+            metadata, texts = list(delta.metadata), list(delta.texts)
+            for frame in frames:
+                for idx, text in enumerate(frame["texts"]):
+                    metadata.append({"source": frame["source"], "chunk": idx, "record": True})
+                    texts.append(text)
+            vectors = np.concatenate([delta.vectors] + [frame["vectors"] for frame in frames])
+            self.delta = Delta(vectors, metadata, texts)
+            return True
+
+
+def scan_sources(data_dirs):
+    manifest = {}
+    paths = {}
+    for path in iter_source_files(data_dirs):
+        stat = path.stat()
+        manifest[path.name] = [stat.st_mtime_ns, stat.st_size]
+        paths[path.name] = path
+    return manifest, paths
+
+
+def record_source(record):
+    return f"result_{record['id']}"
+
+
+def _encode(model, texts):
+    if not texts:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype="float32")
+    with span("encode"):
+        embeddings = np.asarray(model.encode(texts, show_progress_bar=False), dtype="float32")
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+def _chunker_settings(cfg):
+    if cfg.chunk_by == "words":
+        return ["words", cfg.chunk_size, cfg.chunk_overlap]
+    return [cfg.chunk_by, cfg.chunk_tokens, cfg.chunk_overlap_tokens]
+
+
+def shard_names(cfg):
+    if cfg.shard_by == "source":
+        return [cfg.data_dir.name, cfg.results_dir.name]
+    if cfg.shard_by == "hash":
+        return [f"shard-{i:02d}" for i in range(cfg.hash_shards)]
+    if cfg.shard_by != "none":
+        raise ValueError(f"Unsupported shard_by: {cfg.shard_by}")
+    return [None]
+
+
+def shard_of(cfg, group, name):
+    if cfg.shard_by == "source":
+        return group
+    if cfg.shard_by == "hash":
+        return f"shard-{zlib.crc32(name.encode('utf-8')) % cfg.hash_shards:02d}"
+    return None
+
+
+def shard_root(cfg, shard=None):
+    return cfg.snapshots_dir if shard is None else cfg.snapshots_dir / shard
+
+
+def _store_watermark(cfg, store, shard, since=0):
+    if cfg.shard_by != "hash":
+        return store.last_rowid()
+    # Only records hashed to this shard move its watermark, so other shards are not rebuilt.
+    watermark = since
+    for row_id, record_id in store.ids_since(since):
+        if shard_of(cfg, cfg.results_dir.name, record_source({"id": record_id})) == shard:
+            watermark = row_id
+    return watermark
+
+
+def build_snapshot(cfg, model, previous=None, shard=None):
+    manifest, paths = scan_sources([cfg.data_dir, cfg.results_dir])
+    if shard is not None:
+        paths = {name: path for name, path in paths.items() if shard_of(cfg, path.parent.name, name) == shard}
+        manifest = {name: manifest[name] for name in paths}
+    manifest[CHUNKER_KEY] = _chunker_settings(cfg)
+    store = None
+    if shard is None or cfg.shard_by != "source" or shard == cfg.results_dir.name:
+        store = results_store(cfg)
+        since = previous.manifest.get(STORE_KEY, 0) if previous is not None else 0
+        manifest[STORE_KEY] = _store_watermark(cfg, store, shard, since)
+    if previous is not None and previous.manifest == manifest:
+        return None
+
+    reuse = {}
+    prev_vectors = None
+    watermark = 0
+    if (
+        previous is not None
+        and previous.texts is not None
+        and previous.manifest.get(CHUNKER_KEY) == manifest[CHUNKER_KEY]
+    ):
+        prev_vectors = previous.vectors
+        watermark = previous.manifest.get(STORE_KEY, 0)
+        for row, record in enumerate(previous.metadata):
+            name = record["source"]
+            if record.get("record") or (name in manifest and previous.manifest.get(name) == manifest[name]):
+                reuse.setdefault(name, []).append(row)
+
+    metadata = []
+    parts = []
+    new_texts = []
+    blob = bytearray()
+    spans = []
+
+    def add_document(name, text, char_spans, extra):
+        starts = byte_offsets(text, [start for start, _ in char_spans])
+        ends = byte_offsets(text, [end for _, end in char_spans])
+        base = len(blob)
+        blob.extend(text.encode("utf-8"))
+        for idx, (start, end) in enumerate(zip(starts, ends)):
+            metadata.append({"source": name, "chunk": idx, **extra})
+            spans.append((base + start, base + end))
+        parts.append(slice(len(new_texts), len(new_texts) + len(char_spans)))
+        new_texts.extend(text[start:end] for start, end in char_spans)
+
+    def reuse_rows(rows):
+        row_spans = np.asarray(previous.texts.spans[rows], dtype="int64")
+        low, high = int(row_spans[:, 0].min()), int(row_spans[:, 1].max())
+        base = len(blob)
+        blob.extend(previous.texts.data[low:high])
+        spans.extend(row_spans - low + base)
+        metadata.extend(previous.metadata[row] for row in rows)
+        parts.append(prev_vectors[rows])
+
+    def new_documents():
+        for name, path in paths.items():
+            if name not in reuse:
+                yield (name, {}), path.read_text(encoding="utf-8")
+        if store is None:
+            return
+        for row_id, record in store.iter_since(watermark):
+            if row_id > manifest[STORE_KEY]:
+                break
+            name = record_source(record)
+            if shard is None or shard_of(cfg, cfg.results_dir.name, name) == shard:
+                yield (name, {"record": True}), record["text"]
+
+    for rows in reuse.values():
+        reuse_rows(rows)
+    for (name, extra), text, char_spans in iter_chunks(cfg, model, new_documents()):
+        add_document(name, text, char_spans, extra)
+
+    new_vectors = _encode(model, new_texts)
+    vectors = [new_vectors[part] if isinstance(part, slice) else part for part in parts]
+    if vectors:
+        embeddings = np.concatenate(vectors).astype("float32", copy=False)
+    else:
+        embeddings = new_vectors
+    texts = ChunkTexts(bytes(blob), np.asarray(spans, dtype="uint64").reshape(-1, 2))
+    return Snapshot(None, embeddings, metadata, manifest, texts=texts)
+
+
+def _versions(root):
+    if not root.exists():
+        return []
+    return sorted(
+        p.name for p in root.iterdir() if p.is_dir() and p.name[:1] == "v" and p.name[1:].isdigit()
+    )
+
+
+def current_version(root):
+    pointer = Path(root) / CURRENT_FILE
+    if not pointer.exists():
+        return None
+    return pointer.read_text(encoding="utf-8").strip() or None
+
+
+def _write_index_atomic(index, path):
+    tmp = path.with_name(path.name + ".tmp")
+    faiss.write_index(index, str(tmp))
+    os.replace(tmp, path)
+
+
+def write_snapshot_files(path, vectors, metadata, manifest, quantization="none", texts=None):
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    np.save(path / VECTORS_FILE, np.ascontiguousarray(vectors, dtype="float32"))
+    if quantization == "binary":
+        faiss.write_index_binary(quantized_index(vectors, quantization), str(path / BINARY_CODES_FILE))
+    elif quantization != "none":
+        faiss.write_index(quantized_index(vectors, quantization), str(path / CODES_FILE))
+    offsets = [0]
+    with open(path / METADATA_FILE, "wb") as handle:
+        for record in metadata:
+            line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+            handle.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(path / OFFSETS_FILE, np.asarray(offsets, dtype="uint64"))
+    if texts is not None:
+        with open(path / TEXTS_FILE, "wb") as handle:
+            handle.write(texts.data)
+        np.save(path / SPANS_FILE, np.asarray(texts.spans, dtype="uint64"))
+    (path / MANIFEST_FILE).write_text(json.dumps(manifest), encoding="utf-8")
+
+
+def _frame(header, vectors):
+    header = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    payload = struct.pack("<I", len(header)) + header + np.ascontiguousarray(vectors, dtype="<f4").tobytes()
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _scan_frames(handle, offset):
+    # Yields (end, payload) per intact frame; a torn or corrupt tail ends the log.
+    handle.seek(offset)
+    while True:
+        head = handle.read(_FRAME.size)
+        if len(head) < _FRAME.size:
+            return
+        length, crc = _FRAME.unpack(head)
+        payload = handle.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        offset += _FRAME.size + length
+        yield offset, payload
+
+
+def read_delta(path, offset=0):
+    try:
+        handle = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with handle:
+        for end, payload in _scan_frames(handle, offset):
+            (size,) = struct.unpack_from("<I", payload)
+            frame = json.loads(payload[4 : 4 + size])
+            frame["vectors"] = np.frombuffer(payload[4 + size :], dtype="<f4").reshape(len(frame["texts"]), -1)
+            yield end, frame
+
+
+_delta_ends = {}
+
+
+def append_delta(path, header, vectors):
+    frame = _frame(header, vectors)
+    with open(path, "a+b") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        end = _delta_ends.get(path, 0)
+        for end, _ in _scan_frames(handle, end):
+            pass
+        # Drop a frame torn by a crash so the new one stays reachable.
+        if os.fstat(handle.fileno()).st_size != end:
+            handle.truncate(end)
+        handle.write(frame)
+        handle.flush()
+        os.fsync(handle.fileno())
+        _delta_ends[path] = end + len(frame)
+
+
+def _published_version(root):
+    version = current_version(root)
+    return version if version is not None and (root / version).exists() else None
+
+
+def append_record(cfg, load_model, record, index=None):
+    name = record_source(record)
+    shard = shard_of(cfg, cfg.results_dir.name, name)
+    root = shard_root(cfg, shard)
+    # The store is the source of truth: make the record durable before logging its chunks, so a
+    # crash in between only delays it until the next rebuild.
+    store = results_store(cfg)
+    store.flush()
+    version = _published_version(root)
+    if version is None:
+        # Nothing published yet (a fresh checkout only has the legacy export): build the first
+        # snapshot, which reads the record from the store.
+        with build_lock(root, blocking=True):
+            version = _published_version(root)
+            if version is None:
+                version = publish_snapshot(cfg, build_snapshot(cfg, load_model(), shard=shard), shard)
+                prune_snapshots(root, cfg.keep_snapshots)
+                if index is not None and shard in index.shards:
+                    index.shards[shard].refresh(load_model)
+                return version
+    model = load_model()
+    texts = [
+        text[start:end]
+        for _, text, char_spans in iter_chunks(cfg, model, [(name, record["text"])])
+        for start, end in char_spans
+    ]
+    if not texts:
+        return None
+    vectors = _encode(model, texts)
+    header = {"source": name, "rowid": store.rowid(record["id"]), "texts": texts}
+    with span("index_append"):
+        append_delta(root / version / DELTA_FILE, header, vectors)
+    if index is not None:
+        index.catch_up()
+    return version
+
+
+def ingest_hook(load_model, index=None):
+    # Returns whether the record reached the index; failures are reported, never raised.
+    def hook(cfg, record):
+        try:
+            return append_record(cfg, load_model, record, index) is not None
+        except Exception as exc:
+            print(f"Index append failed for {record['id']}: {exc}", file=sys.stderr)
+            return False
+
+    return hook
+
+
+def publish_snapshot(cfg, snapshot, shard=None):
+    with span("index_write"):
+        return _publish_snapshot(cfg, snapshot, shard)
+
+
+def _publish_snapshot(cfg, snapshot, shard):
+    root = shard_root(cfg, shard)
+    root.mkdir(parents=True, exist_ok=True)
+    versions = _versions(root)
+    number = int(versions[-1][1:]) + 1 if versions else 1
+    version = f"v{number:06d}"
+    staging = root / f".{version}.tmp"
+    if staging.exists():
+        shutil.rmtree(staging)
+    write_snapshot_files(
+        staging,
+        snapshot.vectors,
+        snapshot.metadata,
+        snapshot.manifest,
+        cfg.index_quantization,
+        snapshot.texts,
+    )
+    os.replace(staging, root / version)
+    write_text_atomic(root / CURRENT_FILE, version)
+    snapshot.version = version
+    return version
+
+
+def export_legacy(cfg, snapshot):
+    # Full copy with every chunk's text; only `ingest.py --legacy-export` writes it.
+    with span("index_write"):
+        index = snapshot.index if isinstance(snapshot.index, faiss.Index) else flat_index(snapshot.vectors)
+        _write_index_atomic(index, cfg.index_path)
+        save_metadata(cfg.metadata_path, snapshot.records(range(len(snapshot.metadata))))
+
+
+def load_snapshot(root, version, use_mmap=True, rescore_factor=8):
+    path = Path(root) / version
+    manifest = json.loads((path / MANIFEST_FILE).read_text(encoding="utf-8"))
+    metadata = MmapMetadata(path / METADATA_FILE, path / OFFSETS_FILE)
+    texts = None
+    if (path / TEXTS_FILE).exists():
+        texts = ChunkTexts.load(path / TEXTS_FILE, path / SPANS_FILE, use_mmap)
+    codes = None
+    if (path / BINARY_CODES_FILE).exists():
+        codes = faiss.read_index_binary(str(path / BINARY_CODES_FILE))
+    elif (path / CODES_FILE).exists():
+        codes = faiss.read_index(str(path / CODES_FILE))
+    if codes is not None:
+        vectors = np.load(path / VECTORS_FILE, mmap_mode="r")
+        index = RescoringIndex(codes, vectors, rescore_factor)
+        snapshot = Snapshot(version, vectors, metadata, manifest, index=index, texts=texts, path=path)
+    elif use_mmap:
+        vectors = np.load(path / VECTORS_FILE, mmap_mode="r")
+        snapshot = Snapshot(version, vectors, metadata, manifest, index=MmapFlatIndex(vectors), texts=texts, path=path)
+    else:
+        vectors = np.load(path / VECTORS_FILE)
+        snapshot = Snapshot(version, vectors, list(metadata), manifest, texts=texts, path=path)
+    snapshot.load_delta()
+    return snapshot
+
+
+def load_options(cfg):
+    return {"use_mmap": cfg.index_mmap, "rescore_factor": cfg.rescore_factor}
+
+
+def load_current(cfg, shard=None):
+    root = shard_root(cfg, shard)
+    version = current_version(root)
+    if version is not None and (root / version).exists():
+        return load_snapshot(root, version, **load_options(cfg))
+    if shard is None and cfg.index_path.exists() and cfg.metadata_path.exists():
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if cfg.index_mmap else 0
+        index = faiss.read_index(str(cfg.index_path), flags)
+        return Snapshot(None, None, load_metadata(cfg.metadata_path), index=index)
+    return None
+
+
+@contextmanager
+def build_lock(root, blocking=False):
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / LOCK_FILE, "w") as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def stale_snapshots(root, keep, in_use=()):
+    versions = _versions(root)
+    current = current_version(root)
+    return [
+        version
+        for version in (versions[:-keep] if keep > 0 else versions)
+        if version != current and version not in in_use
+    ]
+
+
+def remove_snapshots(root, versions):
+    for version in versions:
+        shutil.rmtree(Path(root) / version, ignore_errors=True)
+
+
+def prune_snapshots(root, keep, in_use=()):
+    remove_snapshots(root, stale_snapshots(root, keep, in_use))
+
+
+class LiveIndex:
+    def __init__(self, cfg, shard=None, snapshot=None):
+        self.cfg = cfg
+        self.shard = shard
+        self.root = shard_root(cfg, shard)
+        self._lock = threading.Lock()
+        self._current = snapshot
+        self._retired = []
+
+    @property
+    def loaded(self):
+        return self._current is not None
+
+    @property
+    def version(self):
+        return self._current.version if self._current is not None else None
+
+    @contextmanager
+    def acquire(self):
+        with self._lock:
+            snapshot = self._current
+            if snapshot is not None:
+                snapshot.readers += 1
+        try:
+            yield snapshot
+        finally:
+            if snapshot is not None:
+                stale = []
+                with self._lock:
+                    snapshot.readers -= 1
+                    if snapshot.readers == 0 and snapshot in self._retired:
+                        stale = self._drain()
+                remove_snapshots(self.root, stale)
+
+    def swap(self, snapshot):
+        with self._lock:
+            if self._current is not None:
+                self._retired.append(self._current)
+            self._current = snapshot
+            stale = self._drain()
+        remove_snapshots(self.root, stale)
+
+    def _drain(self):
+        # Only decides what to delete; callers remove it after releasing the lock searches take.
+        self._retired = [s for s in self._retired if s.readers > 0]
+        in_use = {s.version for s in self._retired if s.version}
+        return stale_snapshots(self.root, self.cfg.keep_snapshots, in_use)
+
+    def catch_up(self):
+        with self.acquire() as snapshot:
+            return snapshot is not None and snapshot.load_delta()
+
+    def refresh(self, load_model):
+        cfg = self.cfg
+        published = current_version(self.root)
+        if published is not None and published != self.version:
+            self.swap(load_snapshot(self.root, published, **load_options(cfg)))
+
+        with build_lock(self.root) as owner:
+            if not owner:
+                return False
+            with self.acquire() as current:
+                snapshot = build_snapshot(cfg, load_model(), previous=current, shard=self.shard)
+            if snapshot is None:
+                return False
+            version = publish_snapshot(cfg, snapshot, self.shard)
+        self.swap(load_snapshot(self.root, version, **load_options(cfg)))
+        return True
+
+
+class ShardedIndex:
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.shards = {name: LiveIndex(cfg, name) for name in shard_names(cfg)}
+        self._pool = ThreadPoolExecutor(max_workers=cfg.search_threads, thread_name_prefix="shard-search")
+
+    def load(self):
+        for live in self.shards.values():
+            snapshot = load_current(self.cfg, live.shard)
+            if snapshot is not None:
+                live.swap(snapshot)
+        return self
+
+    @property
+    def loaded(self):
+        return any(live.loaded for live in self.shards.values())
+
+    @property
+    def versions(self):
+        return {live.shard or "default": live.version for live in self.shards.values()}
+
+    def catch_up(self):
+        return any([live.catch_up() for live in self.shards.values()])
+
+    def search(self, query_vecs, k, shards=None):
+        if shards:
+            # `versions` labels the unsharded index "default"; accept that name back.
+            shards = [None if name == "default" and None in self.shards else name for name in shards]
+            unknown = set(shards) - set(self.shards)
+            if unknown:
+                raise ValueError(f"Unknown shard(s): {', '.join(sorted(map(str, unknown)))}")
+            selected = [self.shards[name] for name in shards]
+        else:
+            selected = list(self.shards.values())
+        if len(selected) == 1:
+            partials = [_search_shard(selected[0], query_vecs, k)]
+        else:
+            futures = [
+                self._pool.submit(contextvars.copy_context().run, _search_shard, live, query_vecs, k)
+                for live in selected
+            ]
+            partials = [future.result() for future in futures]
+        return [
+            heapq.nlargest(k, (hit for partial in partials for hit in partial[row]), key=lambda h: h["score"])
+            for row in range(len(query_vecs))
+        ]
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+
+def _search_shard(live, query_vecs, k):
+    with live.acquire() as snapshot:
+        if snapshot is None:
+            return [[] for _ in range(len(query_vecs))]
+        with span("index_search"):
+            scores, ids = snapshot.search(query_vecs, k)
+        with span("metadata_lookup"):
+            return [
+                [
+                    dict(snapshot.record(i), score=float(score), shard=live.shard)
+                    for score, i in zip(row_scores, row_ids)
+                    if i != -1
+                ]
+                for row_scores, row_ids in zip(scores, ids)
+            ]
+
+
+def open_index(cfg):
+    return ShardedIndex(cfg).load()
+
+
+class IndexWatcher(threading.Thread):
+    def __init__(self, index, load_model, interval_s=None):
+        super().__init__(name="index-watcher", daemon=True)
+        self.index = index
+        self.load_model = load_model
+        self.interval_s = interval_s or index.cfg.refresh_interval_s
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval_s):
+            self.refresh_once()
+
+    def refresh_once(self):
+        changed = False
+        for live in self.index.shards.values():
+            try:
+                changed = live.catch_up() or changed
+                changed = live.refresh(self.load_model) or changed
+            except Exception as exc:
+                print(f"Index refresh failed for shard {live.shard or 'default'}: {exc}", file=sys.stderr)
+        return changed
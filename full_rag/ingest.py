@@ -1,38 +1,60 @@
 #!/usr/bin/env python3
-import json
-from pathlib import Path
-
-import faiss
-import numpy as np
-from sentence_transformers import SentenceTransformer
+import argparse
 
 from config import default_config
-from utils import chunk_text, load_texts, save_metadata
+from embedding import load_encoder
+from index_store import (
+    build_lock,
+    build_snapshot,
+    export_legacy,
+    prune_snapshots,
+    publish_snapshot,
+    shard_names,
+    shard_root,
+)
+from timings import collect, format_timings
 
 
 def main():
     cfg = default_config()
+    parser = argparse.ArgumentParser(description="Build the RAG index.")
+    parser.add_argument(
+        "--shard",
+        action="append",
+        help="Rebuild only this shard (repeatable). Shards depend on RagConfig.shard_by.",
+    )
+    parser.add_argument("--timings", action="store_true", help="Print a per-stage time breakdown.")
+    parser.add_argument(
+        "--legacy-export",
+        action="store_true",
+        help="Also write index.faiss and metadata.json (with chunk text) for older readers.",
+    )
+    args = parser.parse_args()
+
+    shards = shard_names(cfg)
+    if args.shard:
+        unknown = set(args.shard) - set(shards)
+        if unknown:
+            parser.error(f"unknown shard(s): {', '.join(sorted(unknown))}; available: {shards}")
+        shards = args.shard
+
     cfg.results_dir.mkdir(parents=True, exist_ok=True)
     cfg.logs_dir.mkdir(parents=True, exist_ok=True)
-    docs = load_texts([cfg.data_dir, cfg.results_dir])
-    chunks = []
-    metadata = []
-    for filename, text in docs:
-        for idx, chunk in enumerate(chunk_text(text, cfg.chunk_size, cfg.chunk_overlap)):
-            chunks.append(chunk)
-            metadata.append({"source": filename, "chunk": idx, "text": chunk})
-
-    model = SentenceTransformer(cfg.embed_model_name)
-    embeddings = model.encode(chunks, show_progress_bar=True)
-    embeddings = np.asarray(embeddings, dtype="float32")
-
-    index = faiss.IndexFlatIP(embeddings.shape[1])
-    faiss.normalize_L2(embeddings)
-    index.add(embeddings)
-
-    faiss.write_index(index, str(cfg.index_path))
-    save_metadata(cfg.metadata_path, metadata)
-    print(f"Indexed {len(chunks)} chunks to {cfg.index_path}")
+
+    with collect() as recorder:
+        model = load_encoder(cfg)
+        for shard in shards:
+            # Wait for a running server's watcher rather than racing it for the next version.
+            root = shard_root(cfg, shard)
+            with build_lock(root, blocking=True):
+                snapshot = build_snapshot(cfg, model, shard=shard)
+                version = publish_snapshot(cfg, snapshot, shard)
+                if shard is None and args.legacy_export:
+                    export_legacy(cfg, snapshot)
+                prune_snapshots(root, cfg.keep_snapshots)
+            print(f"Indexed {len(snapshot.metadata)} chunks to {root} ({version})")
+    if args.timings:
+        print(format_timings(recorder))
 
 
 if __name__ == "__main__":
@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 import os
 import sys
+import time
+
+from timings import emit_child
 
 
 def main():
@@ -21,6 +24,7 @@ def main():
         sys.exit(1)
 
     threads = os.cpu_count() or 4
+    start = time.perf_counter()
     llm = Llama(
         model_path=model_path,
         n_ctx=1024,
@@ -29,8 +33,24 @@ def main():
         use_mmap=False,
         verbose=False,
     )
-    output = llm(prompt, max_tokens=256)
-    sys.stdout.write(output["choices"][0]["text"].strip())
+    loaded = time.perf_counter()
+    first_token = None
+    pieces = []
+    for chunk in llm(prompt, max_tokens=256, stream=True):
+        if first_token is None:
+            first_token = time.perf_counter()
+        pieces.append(chunk["choices"][0]["text"])
+    done = time.perf_counter()
+    first_token = first_token or done
+    sys.stdout.write("".join(pieces).strip())
+    emit_child(
+        {
+            "llm_load": loaded - start,
+            "llm_prefill": first_token - loaded,
+            "llm_decode": done - first_token,
+        },
+        sys.stderr,
+    )
 
 
 if __name__ == "__main__":
@@ -4,55 +4,44 @@ import os
 import re
 import subprocess
 import sys
+import time
+from functools import partial
 from pathlib import Path
 
-import faiss
-import numpy as np
-from sentence_transformers import SentenceTransformer
-
+from agent_loop import format_steps, parse_tool_calls, run_agent_loop, run_concurrently
 from config import default_config
-from power_analysis import run_power_flow, save_result
-from utils import load_metadata
+from embedding import encode_queries, load_encoder
+from power_analysis import run_power_flow, run_power_flow_batch, save_result
+from index_store import ingest_hook, open_index
+from timings import collect, format_timings, pop_flag, record_child, span, strip_child
 
 
-def retrieve_contexts(query, cfg):
-    metadata = load_metadata(cfg.metadata_path)
-    index = faiss.read_index(str(cfg.index_path))
-    model = SentenceTransformer(cfg.embed_model_name)
-    query_vec = model.encode([query]).astype("float32")
-    faiss.normalize_L2(query_vec)
-    _, ids = index.search(query_vec, cfg.top_k)
-    return [metadata[i]["text"] for i in ids[0] if i != -1]
+def retrieve_contexts(query, cfg, index=None, model=None):
+    index = index or open_index(cfg)
+    model = model or load_encoder(cfg)
+    query_vec = encode_queries(model, [query])
+    return [hit["text"] for hit in index.search(query_vec, cfg.top_k)[0]]
 
 
 def call_llm(prompt):
     script = Path(__file__).parent / "llm_generate.py"
-    result = subprocess.run(
-        [sys.executable, str(script)],
-        input=prompt,
-        text=True,
-        capture_output=True,
-    )
+    with span("llm"):
+        result = subprocess.run(
+            [sys.executable, str(script)],
+            input=prompt,
+            text=True,
+            capture_output=True,
+        )
+    record_child(result.stderr)
     if result.returncode != 0:
-        return "LLM failed: " + (result.stderr.strip() or "unknown error")
+        return "LLM failed: " + (strip_child(result.stderr).strip() or "unknown error")
     return result.stdout.strip()
 
 
-def parse_tool_response(text):
-    lines = text.strip().splitlines()
-    if not lines:
-        return ("FINAL", "")
-    head = lines[0].strip()
-    if head == "PANDAPOWER":
-        try:
-            end_idx = lines.index("END")
-        except ValueError:
-            return ("FINAL", text)
-        payload = "\n".join(lines[1:end_idx]).strip()
-        return ("PANDAPOWER", payload)
-    if head == "FINAL":
-        return ("FINAL", "\n".join(lines[1:]).strip())
-    return ("FINAL", text)
+PAYLOAD_ERROR = (
+    'could not parse the PANDAPOWER payload; send one JSON object like '
+    '{"case":"case14","load_scale":1.0,"gen_scale":1.0}'
+)
 
 
 def parse_params_from_text(text):
@@ -95,9 +84,110 @@ def parse_query_hints(query):
     }
 
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python power_agent.py 'your question'")
+def normalize_params(params):
+    return {
+        "case": params.get("case", "case14"),
+        "load_scale": float(params.get("load_scale", 1.0)),
+        "gen_scale": float(params.get("gen_scale", 1.0)),
+        "note": str(params.get("note", "")),
+    }
+
+
+def request_params(payload):
+    params = parse_params_from_text(payload)
+    if not isinstance(params, dict):
+        return None
+    try:
+        return normalize_params(params)
+    except (TypeError, ValueError):
+        return None
+
+
+def scenario_params(query, calls):
+    requested = [request_params(payload) for _, payload in calls]
+    requested = [params for params in requested if params]
+    hints = parse_query_hints(query)
+    # Explicit values in a single-scenario question win over what the model extracted.
+    if not requested or (len(requested) == 1 and any(hints.values())):
+        requested = [normalize_params(parse_query_fallback(query))]
+    return requested
+
+
+def _solve_case(case, scenarios):
+    if len(scenarios) > 1:
+        try:
+            return run_power_flow_batch(case, [(p["load_scale"], p["gen_scale"]) for p in scenarios])
+        except ValueError:
+            pass
+    summaries = []
+    for params in scenarios:
+        try:
+            summaries.append(run_power_flow(case, params["load_scale"], params["gen_scale"]))
+        except Exception as exc:
+            summaries.append(f"error: {exc}")
+    return summaries
+
+
+def solve_scenarios(scenarios, max_parallel, timeout_s):
+    # Scenarios on one case share a batched solve; different cases run side by side.
+    groups = {}
+    for position, params in enumerate(scenarios):
+        groups.setdefault(params["case"], []).append(position)
+    tasks = [partial(_solve_case, case, [scenarios[i] for i in positions]) for case, positions in groups.items()]
+    outcomes = [None] * len(scenarios)
+    for positions, result in zip(groups.values(), run_concurrently(tasks, max_parallel, timeout_s)):
+        if isinstance(result, str):
+            result = [result] * len(positions)
+        for position, summary in zip(positions, result):
+            if isinstance(summary, dict) and not summary["converged"]:
+                summary = "error: power flow did not converge"
+            outcomes[position] = summary
+    return outcomes
+
+
+def tool_output(params, summary, result_id):
+    if isinstance(summary, str):
+        return f"{params['case']} load_scale={params['load_scale']} gen_scale={params['gen_scale']}: {summary}"
+    return (
+        f"Result saved as {result_id}. Summary: "
+        f"case={params['case']}, load_scale={params['load_scale']}, gen_scale={params['gen_scale']}, "
+        f"converged={summary['converged']}, "
+        f"load_mw={summary['total_load_mw']}, "
+        f"gen_mw={summary['total_gen_mw']}, "
+        f"losses_mw={summary['losses_mw']}, "
+        f"vmin/vmax={summary['vmin_pu']}/{summary['vmax_pu']}, "
+        f"max_line_loading={summary['max_line_loading_percent']}."
+    )
+
+
+def result_lines(params, summary, result_id, indexed=False):
+    if isinstance(summary, str):
+        return [
+            "Pandapower result:",
+            f"- case: {params['case']}",
+            f"- load_scale: {params['load_scale']}",
+            f"- gen_scale: {params['gen_scale']}",
+            f"- failed: {summary[len('error: '):]}",
+        ]
+    return [
+        "Pandapower result:",
+        f"- case: {params['case']}",
+        f"- load_scale: {params['load_scale']}",
+        f"- gen_scale: {params['gen_scale']}",
+        f"- converged: {summary['converged']}",
+        f"- total_load_mw: {summary['total_load_mw']}",
+        f"- total_gen_mw: {summary['total_gen_mw']}",
+        f"- losses_mw: {summary['losses_mw']}",
+        f"- vmin/vmax_pu: {summary['vmin_pu']}/{summary['vmax_pu']}",
+        f"- max_line_loading_percent: {summary['max_line_loading_percent']}",
+        f"- saved: {result_id}",
+        "- rag: index updated" if indexed else "- rag: not indexed yet (run: python ingest.py)",
+    ]
+
+
+def run(args):
+    if not args:
+        print("Usage: python power_agent.py [--timings] 'your question'")
         sys.exit(1)
 
     if not os.environ.get("LLAMA_MODEL_PATH"):
@@ -105,17 +195,28 @@ def main():
         sys.exit(1)
 
     cfg = default_config()
-    if not cfg.index_path.exists() or not cfg.metadata_path.exists():
+    index = open_index(cfg)
+    if not index.loaded:
         print("Index not found. Running ingest...")
         subprocess.run([sys.executable, "ingest.py"], cwd=Path(__file__).parent)
+        index = open_index(cfg)
 
-    query = " ".join(sys.argv[1:])
-    contexts = retrieve_contexts(query, cfg)
+    query = " ".join(args)
+    model = load_encoder(cfg)
+    index_result = ingest_hook(lambda: model, index)
+    indexed = set()
+
+    def on_saved(cfg, record):
+        if index_result(cfg, record):
+            indexed.add(record["id"])
+    contexts = retrieve_contexts(query, cfg, index, model)
     context_text = "\n".join(contexts)
 
     system_prompt = (
         "You are a local RAG power-system agent.\n"
         "If a power-flow analysis is needed, request the pandapower tool. "
+        "To compare scenarios, repeat the PANDAPOWER block once per scenario; "
+        "they run together and the results come back in the next turn. "
         "If the question is in Japanese, answer in Japanese.\n\n"
         "Respond in one of these exact formats ONLY:\n"
         "PANDAPOWER\n"
@@ -127,97 +228,63 @@ def main():
         "Supported cases: case9, case14, case30, case118."
     )
 
-    prompt = (
-        system_prompt
-        + "\n\nContext:\n"
-        + context_text
-        + "\n\nQuestion: "
-        + query
-        + "\nAnswer:"
-    )
-    response = call_llm(prompt)
-    mode, payload = parse_tool_response(response)
-
-    params = None
-    if mode == "PANDAPOWER":
-        params = parse_params_from_text(payload) or None
-    fallback = parse_query_fallback(query)
-    hints = parse_query_hints(query)
-    if hints["has_case"] or hints["has_load_scale"] or hints["has_gen_scale"]:
-        params = fallback
-    elif params is None:
-        params = fallback
-
-    params = {
-        "case": params.get("case", "case14"),
-        "load_scale": float(params.get("load_scale", 1.0)),
-        "gen_scale": float(params.get("gen_scale", 1.0)),
-        "note": str(params.get("note", "")),
-    }
-
-    if mode == "PANDAPOWER" or params.get("note") == "fallback":
-        try:
-            summary = run_power_flow(
-                params["case"], params["load_scale"], params["gen_scale"]
-            )
-        except Exception as exc:
-            print(f"Power-flow failed: {exc}")
-            sys.exit(1)
+    def build_prompt(steps, note):
+        prompt = system_prompt + "\n\nContext:\n" + context_text + "\n\nQuestion: " + query
+        if steps:
+            prompt += "\n\nPandapower output:\n" + format_steps(steps)
+        if note:
+            prompt += "\n\n" + note
+        return prompt + "\nAnswer:"
+
+    summary_lines = []
+    saved = []
+
+    def execute(calls, timeout_s, scenarios=None):
+        scenarios = scenarios or [request_params(payload) for _, payload in calls]
+        runnable = [params for params in scenarios if params]
+        summaries = iter(solve_scenarios(runnable, cfg.agent_max_parallel, timeout_s) if runnable else [])
+        outputs = []
+        for params in scenarios:
+            if params is None:
+                outputs.append(f"error: {PAYLOAD_ERROR}")
+                continue
+            summary = next(summaries)
+            result_id = None
+            if not isinstance(summary, str):
+                result_id = save_result(cfg, query, params, summary, on_saved=on_saved)
+                saved.append(result_id)
+            if summary_lines:
+                summary_lines.append("")
+            summary_lines.extend(result_lines(params, summary, result_id, result_id in indexed))
+            outputs.append(tool_output(params, summary, result_id))
+        return outputs
+
+    # The first round and any follow-up rounds share one time budget.
+    deadline = time.monotonic() + cfg.agent_time_budget_s
+    calls, _ = parse_tool_calls(call_llm(build_prompt([], None)), {"PANDAPOWER"}, cfg.agent_max_tool_calls)
+    scenarios = scenario_params(query, calls)
+    payloads = [json.dumps(params) for params in scenarios]
+    outputs = execute(None, max(0.0, deadline - time.monotonic()), scenarios)
+    if not saved:
+        print("Power-flow failed: " + "; ".join(outputs))
+        sys.exit(1)
+    steps = [[("PANDAPOWER", payload, output) for payload, output in zip(payloads, outputs)]]
 
-        result_path = save_result(cfg.results_dir, query, params, summary)
-        subprocess.run([sys.executable, "ingest.py"], cwd=Path(__file__).parent)
+    answer = None
+    if os.environ.get("POWER_AGENT_LLM_SUMMARY") == "1":
+        answer, steps = run_agent_loop(call_llm, build_prompt, {"PANDAPOWER"}, cfg, steps, execute, deadline)
 
-        tool_output = (
-            f"Result saved to {result_path.name}. Summary: "
-            f"converged={summary['converged']}, "
-            f"load_mw={summary['total_load_mw']}, "
-            f"gen_mw={summary['total_gen_mw']}, "
-            f"losses_mw={summary['losses_mw']}, "
-            f"vmin/vmax={summary['vmin_pu']}/{summary['vmax_pu']}, "
-            f"max_line_loading={summary['max_line_loading_percent']}."
-        )
+    if answer:
+        summary_lines.extend(["", "LLM summary:", answer])
+    print("\n".join(summary_lines))
 
-        summary_lines = [
-            "Pandapower result:",
-            f"- case: {params['case']}",
-            f"- load_scale: {params['load_scale']}",
-            f"- gen_scale: {params['gen_scale']}",
-            f"- converged: {summary['converged']}",
-            f"- total_load_mw: {summary['total_load_mw']}",
-            f"- total_gen_mw: {summary['total_gen_mw']}",
-            f"- losses_mw: {summary['losses_mw']}",
-            f"- vmin/vmax_pu: {summary['vmin_pu']}/{summary['vmax_pu']}",
-            f"- max_line_loading_percent: {summary['max_line_loading_percent']}",
-            f"- saved: {result_path.name}",
-            "- rag: index updated",
-        ]
 
-        if os.environ.get("POWER_AGENT_LLM_SUMMARY") == "1":
-            followup = (
-                system_prompt
-                + "\n\nContext:\n"
-                + context_text
-                + "\n\nQuestion: "
-                + query
-                + "\n\nPandapower output:\n"
-                + tool_output
-                + "\n\nAnswer:"
-            )
-            response = call_llm(followup)
-            mode, payload = parse_tool_response(response)
-            if mode != "FINAL":
-                payload = response
-            if payload:
-                summary_lines.append("")
-                summary_lines.append("LLM summary:")
-                summary_lines.append(payload)
-
-        print("\n".join(summary_lines))
-        return
-
-    if mode != "FINAL":
-        payload = response
-    print(payload)
+def main():
+    args, show_timings = pop_flag(sys.argv[1:])
+    with collect() as recorder:
+        run(args)
+    if show_timings:
+        print(format_timings(recorder), file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -1,35 +1,47 @@
+import atexit
 import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from pathlib import Path
+from multiprocessing import get_context
 
+import numpy as np
 
-def run_power_flow(case_name, load_scale, gen_scale):
+from record_store import new_record_id, results_store
+from timings import span
+
+
+CASES = ("case9", "case14", "case30", "case118")
+
+
+def _pandapower():
     try:
         import pandapower as pp
         import pandapower.networks as pn
     except Exception as exc:
         raise RuntimeError(f"pandapower import failed: {exc}") from exc
+    return pp, pn
 
-    cases = {
-        "case9": pn.case9,
-        "case14": pn.case14,
-        "case30": pn.case30,
-        "case118": pn.case118,
-    }
-    if case_name not in cases:
+
+def load_case(case_name, load_scale=1.0, gen_scale=1.0):
+    _, pn = _pandapower()
+    if case_name not in CASES:
         raise ValueError(f"Unsupported case: {case_name}")
 
-    net = cases[case_name]()
-    if load_scale != 1.0 and not net.load.empty:
-        net.load["p_mw"] = net.load["p_mw"] * load_scale
-        net.load["q_mvar"] = net.load["q_mvar"] * load_scale
-    if gen_scale != 1.0 and not net.gen.empty:
-        net.gen["p_mw"] = net.gen["p_mw"] * gen_scale
-    if gen_scale != 1.0 and hasattr(net, "sgen") and not net.sgen.empty:
-        net.sgen["p_mw"] = net.sgen["p_mw"] * gen_scale
+    with span("case_load"):
+        net = getattr(pn, case_name)()
+        if load_scale != 1.0 and not net.load.empty:
+            net.load["p_mw"] = net.load["p_mw"] * load_scale
+            net.load["q_mvar"] = net.load["q_mvar"] * load_scale
+        if gen_scale != 1.0 and not net.gen.empty:
+            net.gen["p_mw"] = net.gen["p_mw"] * gen_scale
+        if gen_scale != 1.0 and hasattr(net, "sgen") and not net.sgen.empty:
+            net.sgen["p_mw"] = net.sgen["p_mw"] * gen_scale
+    return net
 
-    pp.runpp(net)
 
+def summarize(net, case_name):
     total_load = float(net.res_load.p_mw.sum()) if not net.res_load.empty else 0.0
     total_gen = 0.0
     if hasattr(net, "res_gen") and not net.res_gen.empty:
@@ -54,7 +66,7 @@ def run_power_flow(case_name, load_scale, gen_scale):
         top = net.res_line.loading_percent.sort_values(ascending=False).head(5)
         top_lines = [(int(idx), float(val)) for idx, val in top.items()]
 
-    summary = {
+    return {
         "case": case_name,
         "converged": bool(getattr(net, "converged", True)),
         "total_load_mw": round(total_load, 4),
@@ -65,7 +77,352 @@ def run_power_flow(case_name, load_scale, gen_scale):
         "max_line_loading_percent": round(max_loading, 4) if max_loading is not None else None,
         "top_lines": top_lines,
     }
-    return summary
+
+
+def run_power_flow(case_name, load_scale, gen_scale):
+    pp, _ = _pandapower()
+    net = load_case(case_name, load_scale, gen_scale)
+    with span("power_flow"):
+        pp.runpp(net)
+    return summarize(net, case_name)
+
+
+CONTINGENCY_ELEMENTS = ("line", "trafo")
+AGGRAVATION_PU = 0.01
+AGGRAVATION_PERCENT = 5.0
+# Thread-local so in-process runs from concurrent server requests do not share one network.
+_worker = threading.local()
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _contingency_metrics(net):
+    loading = []
+    for table in ("res_line", "res_trafo"):
+        if hasattr(net, table) and not net[table].empty:
+            loading.extend(
+                (float(value), f"{table[4:]} {int(idx)}")
+                for idx, value in net[table].loading_percent.dropna().items()
+            )
+    vm = net.res_bus.vm_pu.dropna()
+    max_loading, worst = max(loading) if loading else (None, None)
+    return {
+        "vmin_pu": round(float(vm.min()), 4) if not vm.empty else None,
+        "vmax_pu": round(float(vm.max()), 4) if not vm.empty else None,
+        "max_loading_percent": round(max_loading, 4) if max_loading is not None else None,
+        "worst_branch": worst,
+        "islanded_buses": int(net.res_bus.vm_pu.isna().sum()),
+    }
+
+
+def _init_contingency_worker(case_name, load_scale, gen_scale):
+    pp, _ = _pandapower()
+    net = load_case(case_name, load_scale, gen_scale)
+    pp.runpp(net)
+    _worker.pp, _worker.net, _worker.base_res_bus = pp, net, net.res_bus.copy()
+    _worker.base_args = (case_name, load_scale, gen_scale)
+
+
+def _solve_outage(outage):
+    base_args, element, idx = outage
+    # Pool workers outlive a single request, so they rebuild the base case only when it changes.
+    if getattr(_worker, "base_args", None) != base_args:
+        _init_contingency_worker(*base_args)
+    pp, net = _worker.pp, _worker.net
+    row = {"element": element, "index": idx}
+    if element == "line":
+        row["buses"] = [int(net.line.at[idx, "from_bus"]), int(net.line.at[idx, "to_bus"])]
+    else:
+        row["buses"] = [int(net.trafo.at[idx, "hv_bus"]), int(net.trafo.at[idx, "lv_bus"])]
+    net[element].at[idx, "in_service"] = False
+    # Warm start every outage from the intact-network solution.
+    net.res_bus = _worker.base_res_bus.copy()
+    try:
+        pp.runpp(net, init="results")
+        row.update(converged=True, **_contingency_metrics(net))
+    except Exception as exc:
+        row.update(converged=False, error=str(exc).splitlines()[0][:200] if str(exc) else type(exc).__name__)
+    finally:
+        net[element].at[idx, "in_service"] = True
+    return row
+
+
+def _rank_violations(row, v_min, v_max, loading_limit):
+    violations = []
+    severity = 0.0
+    if not row["converged"]:
+        return ["non-convergence"], float("inf")
+    if row["vmin_pu"] is not None and row["vmin_pu"] < v_min:
+        violations.append(f"undervoltage {row['vmin_pu']} pu")
+        severity += 100 * (v_min - row["vmin_pu"])
+    if row["vmax_pu"] is not None and row["vmax_pu"] > v_max:
+        violations.append(f"overvoltage {row['vmax_pu']} pu")
+        severity += 100 * (row["vmax_pu"] - v_max)
+    if row["max_loading_percent"] is not None and row["max_loading_percent"] > loading_limit:
+        violations.append(f"overload {row['worst_branch']} {row['max_loading_percent']}%")
+        severity += row["max_loading_percent"] - loading_limit
+    if row["islanded_buses"]:
+        violations.append(f"{row['islanded_buses']} islanded bus(es)")
+        severity += row["islanded_buses"]
+    return violations, round(severity, 4)
+
+
+def _contingency_pool(workers):
+    # Forkserver children start clean, so a lock held by a server thread is never inherited.
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(workers, mp_context=get_context("forkserver"))
+        return pool
+
+
+@atexit.register
+def _shutdown_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(cancel_futures=True)
+
+
+def run_contingency_analysis(
+    case_name,
+    load_scale=1.0,
+    gen_scale=1.0,
+    elements=CONTINGENCY_ELEMENTS,
+    workers=None,
+    v_min=0.95,
+    v_max=1.05,
+    loading_limit=100.0,
+    top=20,
+):
+    unknown = set(elements) - set(CONTINGENCY_ELEMENTS)
+    if unknown:
+        raise ValueError(f"Unsupported contingency element(s): {', '.join(sorted(unknown))}")
+    base_args = (case_name, load_scale, gen_scale)
+    base = load_case(*base_args)
+    pp, _ = _pandapower()
+    with span("power_flow"):
+        pp.runpp(base)
+    outages = [
+        (base_args, element, int(idx))
+        for element in elements
+        for idx in base[element].index[base[element].in_service]
+    ]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(outages) or 1))
+
+    with span("contingency"):
+        if workers == 1:
+            rows = [_solve_outage(outage) for outage in outages]
+        else:
+            chunksize = max(1, len(outages) // (workers * 4))
+            rows = list(_contingency_pool(workers).map(_solve_outage, outages, chunksize=chunksize))
+
+    # Limits already violated in the intact network only count when an outage makes them clearly worse.
+    base_row = dict(converged=True, **_contingency_metrics(base))
+    base_violations, _ = _rank_violations(base_row, v_min, v_max, loading_limit)
+    if base_row["vmin_pu"] is not None and base_row["vmin_pu"] < v_min:
+        v_min = round(base_row["vmin_pu"] - AGGRAVATION_PU, 4)
+    if base_row["vmax_pu"] is not None and base_row["vmax_pu"] > v_max:
+        v_max = round(base_row["vmax_pu"] + AGGRAVATION_PU, 4)
+    if (base_row["max_loading_percent"] or 0.0) > loading_limit:
+        loading_limit = round(base_row["max_loading_percent"] + AGGRAVATION_PERCENT, 4)
+    for row in rows:
+        row["violations"], row["severity"] = _rank_violations(row, v_min, v_max, loading_limit)
+    ranked = sorted((row for row in rows if row["violations"]), key=lambda row: -row["severity"])
+    return {
+        "case": case_name,
+        "base": summarize(base, case_name),
+        "base_violations": base_violations,
+        "limits": {"v_min_pu": v_min, "v_max_pu": v_max, "loading_percent": loading_limit},
+        "contingencies": len(rows),
+        "with_violations": len(ranked),
+        "non_converged": sum(1 for row in rows if not row["converged"]),
+        "workers": workers,
+        "violations": ranked[:top] if top else ranked,
+    }
+
+
+def _bus_injections(net, base_options):
+    from pandapower.pd2ppc import _pd2ppc
+    from pandapower.pypower.makeSbus import makeSbus
+
+    net._options = dict(base_options)
+    _, ppci = _pd2ppc(net)
+    return makeSbus(ppci["baseMVA"], ppci["bus"], ppci["gen"])
+
+
+class _JacobianPattern:
+    # Sparsity of one Newton-Raphson Jacobian block, computed once and tiled per scenario.
+    def __init__(self, ybus, pv, pq):
+        n = ybus.shape[0]
+        pvpq = np.r_[pv, pq]
+        coo = ybus.tocoo()
+        self.rows = np.r_[coo.row, np.arange(n)]
+        self.cols = np.r_[coo.col, np.arange(n)]
+        self.y = coo.data
+        self.size = len(pvpq) + len(pq)
+        p_index = np.full(n, -1)
+        p_index[pvpq] = np.arange(len(pvpq))
+        q_index = np.full(n, -1)
+        q_index[pq] = len(pvpq) + np.arange(len(pq))
+        # (row map, column map, take real part?, derivative w.r.t. angle?) for dP/dVa, dQ/dVa, dP/dVm, dQ/dVm.
+        self.parts = []
+        block_rows, block_cols = [], []
+        for row_map, col_map, real, angle in (
+            (p_index, p_index, True, True),
+            (q_index, p_index, False, True),
+            (p_index, q_index, True, False),
+            (q_index, q_index, False, False),
+        ):
+            r, c = row_map[self.rows], col_map[self.cols]
+            keep = (r >= 0) & (c >= 0)
+            self.parts.append((keep, real, angle))
+            block_rows.append(r[keep])
+            block_cols.append(c[keep])
+        rows, cols = np.concatenate(block_rows), np.concatenate(block_cols)
+        keys = cols * self.size + rows
+        self.order = np.argsort(keys, kind="stable")
+        unique, self.starts = np.unique(keys[self.order], return_index=True)
+        self.indices = unique % self.size
+        self.indptr = np.searchsorted(unique // self.size, np.arange(self.size + 1))
+        self.nnz = len(unique)
+
+    def matrix(self, v, ibus):
+        from scipy.sparse import csc_matrix
+
+        y_rows, y_cols = self.rows[: len(self.y)], self.cols[: len(self.y)]
+        vn = v / np.abs(v)
+        ds_dvm = np.concatenate([v[:, y_rows] * np.conj(self.y * vn[:, y_cols]), np.conj(ibus) * vn], axis=1)
+        ds_dva = 1j * np.concatenate(
+            [v[:, y_rows] * np.conj(-self.y * v[:, y_cols]), v * np.conj(ibus)], axis=1
+        )
+        data = []
+        for keep, real, angle in self.parts:
+            values = (ds_dva if angle else ds_dvm)[:, keep]
+            data.append(values.real if real else values.imag)
+        data = np.add.reduceat(np.concatenate(data, axis=1)[:, self.order], self.starts, axis=1)
+        count = len(v)
+        offsets = np.arange(count)[:, None]
+        indices = (self.indices[None, :] + self.size * offsets).ravel()
+        indptr = np.r_[(self.indptr[:-1][None, :] + self.nnz * offsets).ravel(), self.nnz * count]
+        return csc_matrix((data.ravel(), indices, indptr), shape=(self.size * count, self.size * count))
+
+
+def _newton_batch(ybus, sbus, v0, pv, pq, max_iter=10, tol=1e-8):
+    from scipy.sparse.linalg import splu
+
+    pvpq = np.r_[pv, pq]
+    pattern = _JacobianPattern(ybus, pv, pq)
+    v = np.array(v0, dtype=complex)
+    converged = np.zeros(len(v), dtype=bool)
+    active = np.arange(len(v))
+    iterations = 0
+    while True:
+        ibus = (ybus @ v[active].T).T
+        mismatch = v[active] * np.conj(ibus) - sbus[active]
+        f = np.concatenate([mismatch[:, pvpq].real, mismatch[:, pq].imag], axis=1)
+        error = np.abs(f).max(axis=1) if f.shape[1] else np.zeros(len(active))
+        done = error < tol
+        converged[active[done]] = True
+        keep = ~done & np.isfinite(error)
+        active, ibus, f = active[keep], ibus[keep], f[keep]
+        if not len(active) or iterations == max_iter:
+            break
+        iterations += 1
+        try:
+            dx = splu(pattern.matrix(v[active], ibus)).solve(-f.ravel()).reshape(len(active), -1)
+        except RuntimeError:
+            break
+        va, vm = np.angle(v[active]), np.abs(v[active])
+        va[:, pvpq] += dx[:, : len(pvpq)]
+        vm[:, pq] += dx[:, len(pvpq) :]
+        v[active] = vm * np.exp(1j * va)
+    return v, converged, iterations
+
+
+def run_power_flow_batch(case_name, scenarios, max_iter=10, tol=1e-8):
+    pp, _ = _pandapower()
+    base = load_case(case_name)
+    with span("power_flow"):
+        pp.runpp(base)
+    internal = base._ppc["internal"]
+    lookups = base._pd2ppc_lookups
+    if len(internal["branch"]) != len(base._ppc["branch"]) or len(internal["bus"]) != len(base._ppc["bus"]):
+        raise ValueError("Batched power flow needs every bus and branch in service")
+
+    # Injections are linear in the two scale factors, so two extra builds give the per-unit directions.
+    with span("case_load"):
+        s_base = _bus_injections(base, base._options)
+        d_load = _bus_injections(load_case(case_name, 2.0, 1.0), base._options) - s_base
+        d_gen = _bus_injections(load_case(case_name, 1.0, 2.0), base._options) - s_base
+    scales = np.asarray(scenarios, dtype=float).reshape(-1, 2)
+    sbus = s_base + (scales[:, :1] - 1.0) * d_load + (scales[:, 1:] - 1.0) * d_gen
+    v0 = np.repeat(internal["V"][None, :], len(scales), axis=0)
+
+    with span("power_flow_batch"):
+        v, converged, _ = _newton_batch(
+            internal["Ybus"], sbus, v0, internal["pv"], internal["pq"], max_iter, tol
+        )
+    return _batch_summaries(base, internal, lookups, case_name, scales, v, converged)
+
+
+def _batch_summaries(base, internal, lookups, case_name, scales, v, converged):
+    base_mva = internal["baseMVA"]
+    ybus, yf, yt = internal["Ybus"], internal["Yf"], internal["Yt"]
+    branch = internal["branch"]
+    from_bus = branch[:, 0].real.astype(int)
+    to_bus = branch[:, 1].real.astype(int)
+    base_kv = internal["bus"][:, 9].real
+    buses = lookups["bus"][base.bus.index.values]
+    load_mw = float((base.load.p_mw * base.load.scaling)[base.load.in_service].sum())
+
+    sf = v[:, from_bus] * np.conj((yf @ v.T).T) * base_mva
+    st = v[:, to_bus] * np.conj((yt @ v.T).T) * base_mva
+    injected = (v * np.conj((ybus @ v.T).T)).real.sum(axis=1) * base_mva
+    branches = lookups["branch"]
+    loss_mask = np.zeros(len(branch), dtype=bool)
+    for element in ("line", "trafo"):
+        if element in branches:
+            loss_mask[slice(*branches[element])] = True
+    losses = (sf + st).real[:, loss_mask].sum(axis=1)
+
+    line_loading = None
+    if "line" in branches and not base.line.empty:
+        start, end = branches["line"]
+        i_from = np.abs(sf[:, start:end]) / (np.abs(v[:, from_bus[start:end]]) * base_kv[from_bus[start:end]])
+        i_to = np.abs(st[:, start:end]) / (np.abs(v[:, to_bus[start:end]]) * base_kv[to_bus[start:end]])
+        i_max = (base.line.max_i_ka * base.line.df * base.line.parallel).values
+        line_loading = np.maximum(i_from, i_to) / np.sqrt(3) / i_max * 100
+
+    summaries = []
+    for row, (load_scale, gen_scale) in enumerate(scales):
+        summary = {"case": case_name, "load_scale": float(load_scale), "gen_scale": float(gen_scale)}
+        if not converged[row]:
+            summaries.append(dict(summary, converged=False))
+            continue
+        vm = np.abs(v[row, buses])
+        total_load = load_mw * load_scale
+        max_loading = None
+        top_lines = []
+        if line_loading is not None:
+            max_loading = float(line_loading[row].max())
+            top = np.argsort(-line_loading[row], kind="stable")[:5]
+            top_lines = [(int(base.line.index[i]), float(line_loading[row, i])) for i in top]
+        summary.update(
+            {
+                "converged": True,
+                "total_load_mw": round(total_load, 4),
+                "total_gen_mw": round(total_load + float(injected[row]), 4),
+                "losses_mw": round(float(losses[row]), 4),
+                "vmin_pu": round(float(vm.min()), 4),
+                "vmax_pu": round(float(vm.max()), 4),
+                "max_line_loading_percent": round(max_loading, 4) if max_loading is not None else None,
+                "top_lines": top_lines,
+            }
+        )
+        summaries.append(summary)
+    return summaries
 
 
 def run_time_series_power_flow(case_name, load_scale, gen_scale, duration_s, step_s):
@@ -106,16 +463,22 @@ def run_time_series_power_flow(case_name, load_scale, gen_scale, duration_s, ste
     }
 
 
-def save_result(results_dir, question, params, summary, extra_lines=None):
-    results_dir = Path(results_dir)
-    results_dir.mkdir(parents=True, exist_ok=True)
+def _store_result(cfg, record, on_saved=None):
+    with span("save_result"):
+        record_id = results_store(cfg).append(record)
+    if on_saved is not None:
+        on_saved(cfg, record)
+    return record_id
+
+
+def save_result(cfg, question, params, summary, extra_lines=None, on_saved=None):
     stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-    filename = f"result_{stamp}.md"
-    path = results_dir / filename
+    record_id = new_record_id()
 
     lines = [
         "# Pandapower Result",
         "",
+        f"- Result ID: {record_id}",
         f"- Timestamp (UTC): {stamp}",
         f"- Question: {question}",
         f"- Case: {params['case']}",
@@ -131,7 +494,7 @@ def save_result(results_dir, question, params, summary, extra_lines=None):
         "## Top Loaded Lines",
         "",
     ]
-    if summary["top_lines"]:
+    if summary.get("top_lines"):
         for line_id, loading in summary["top_lines"]:
             lines.append(f"- line {line_id}: {loading:.2f}%")
     else:
@@ -149,5 +512,64 @@ def save_result(results_dir, question, params, summary, extra_lines=None):
     if extra_lines:
         lines.extend(["", "## Notes"] + extra_lines)
 
-    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
-    return path
+    record = {
+        "id": record_id,
+        "kind": "result",
+        "case": params["case"],
+        "question": question,
+        "params": params,
+        "summary": summary,
+        "text": "\n".join(lines) + "\n",
+    }
+    return _store_result(cfg, record, on_saved)
+
+
+def save_contingency_result(cfg, question, params, report, on_saved=None):
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    record_id = new_record_id()
+    base = report["base"]
+    limits = report["limits"]
+
+    lines = [
+        "# N-1 Contingency Result",
+        "",
+        f"- Result ID: {record_id}",
+        f"- Timestamp (UTC): {stamp}",
+        f"- Question: {question}",
+        f"- Case: {params['case']}",
+        f"- load_scale: {params['load_scale']}",
+        f"- gen_scale: {params['gen_scale']}",
+        f"- Base case converged: {base['converged']}",
+        f"- Base Vmin/Vmax (pu): {base['vmin_pu']} / {base['vmax_pu']}",
+        f"- Base violations: {', '.join(report['base_violations']) or 'none'}",
+        f"- Limits: {limits['v_min_pu']}-{limits['v_max_pu']} pu, loading {limits['loading_percent']}%",
+        f"- Contingencies: {report['contingencies']}",
+        f"- With violations: {report['with_violations']}",
+        f"- Non-converged: {report['non_converged']}",
+        "",
+        "## Ranked Violations",
+        "",
+    ]
+    if report["violations"]:
+        lines.append("| Rank | Outage | Buses | Vmin (pu) | Vmax (pu) | Max loading (%) | Violations |")
+        lines.append("| --- | --- | --- | --- | --- | --- | --- |")
+        for rank, row in enumerate(report["violations"], 1):
+            lines.append(
+                f"| {rank} | {row['element']} {row['index']} | {row['buses'][0]}-{row['buses'][1]} "
+                f"| {row.get('vmin_pu')} | {row.get('vmax_pu')} | {row.get('max_loading_percent')} "
+                f"| {'; '.join(row['violations'])} |"
+            )
+    else:
+        lines.append("- (no violations)")
+
+    record = {
+        "id": record_id,
+        "kind": "contingency",
+        "case": params["case"],
+        "question": question,
+        "params": params,
+        "summary": {key: value for key, value in report.items() if key != "violations"},
+        "violations": report["violations"],
+        "text": "\n".join(lines) + "\n",
+    }
+    return _store_result(cfg, record, on_saved)
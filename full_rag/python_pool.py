@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+import atexit
+import io
+import json
+import os
+import queue
+import select
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+
+from config import default_config
+from timings import span
+
+WORKER_ENV = {
+    "PATH": os.environ.get("PATH", "/usr/bin:/bin"),
+    "LANG": "C.UTF-8",
+    "OMP_NUM_THREADS": "1",
+    "OPENBLAS_NUM_THREADS": "1",
+    "MKL_NUM_THREADS": "1",
+    "MPLBACKEND": "Agg",
+}
+STARTUP_TIMEOUT_S = 60.0
+
+
+class WorkerError(RuntimeError):
+    pass
+
+
+class _Worker:
+    def __init__(self, preload, memory_mb, cpu_s):
+        self.workdir = tempfile.mkdtemp(prefix="pyworker-")
+        self.proc = subprocess.Popen(
+            [
+                sys.executable,
+                "-E",
+                "-s",
+                str(Path(__file__).resolve()),
+                "--worker",
+                ",".join(preload),
+                str(memory_mb),
+                str(cpu_s),
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=self.workdir,
+            env=dict(WORKER_ENV, HOME=self.workdir, TMPDIR=self.workdir),
+            start_new_session=True,
+        )
+        self.uses = 0
+        self.ready = False
+
+    def _read(self, timeout_s):
+        ready, _, _ = select.select([self.proc.stdout], [], [], timeout_s)
+        if not ready:
+            raise TimeoutError
+        line = self.proc.stdout.readline()
+        if not line:
+            raise WorkerError(f"worker exited (code {self.proc.wait()})")
+        return json.loads(line)
+
+    def call(self, code, timeout_s):
+        if not self.ready:
+            self._read(STARTUP_TIMEOUT_S)
+            self.ready = True
+        self.uses += 1
+        try:
+            self.proc.stdin.write(json.dumps({"code": code}).encode("utf-8") + b"\n")
+            self.proc.stdin.flush()
+        except BrokenPipeError as exc:
+            raise WorkerError(f"worker exited (code {self.proc.wait()})") from exc
+        return self._read(timeout_s)
+
+    def kill(self):
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.proc.wait()
+        for stream in (self.proc.stdin, self.proc.stdout):
+            stream.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class PythonPool:
+    def __init__(self, size=2, max_uses=50, timeout_s=10.0, memory_mb=1024, preload=("numpy", "pandas")):
+        self.max_uses = max_uses
+        self.timeout_s = timeout_s
+        self.memory_mb = memory_mb
+        self.preload = tuple(preload)
+        self._idle = queue.Queue()
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        # CPU limit backstops the per-call timeout over a worker's whole life.
+        cpu_s = int(self.timeout_s * self.max_uses + STARTUP_TIMEOUT_S)
+        return _Worker(self.preload, self.memory_mb, cpu_s)
+
+    def run(self, code):
+        with span("python_tool"):
+            return self._run(code)
+
+    def _run(self, code):
+        worker = self._idle.get()
+        try:
+            reply = worker.call(code, self.timeout_s)
+        except TimeoutError:
+            self._replace(worker)
+            return f"error: timed out after {self.timeout_s}s"
+        except WorkerError as exc:
+            self._replace(worker)
+            return f"error: {exc}"
+        if worker.uses >= self.max_uses:
+            self._replace(worker)
+        else:
+            self._idle.put(worker)
+        if not reply["ok"]:
+            return f"error: {reply['error'].strip() or 'unknown error'}"
+        return reply["stdout"].strip() or "(no output)"
+
+    def _replace(self, worker):
+        worker.kill()
+        if not self._closed:
+            self._idle.put(self._spawn())
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def default_pool(cfg=None):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            cfg = cfg or default_config()
+            _pool = PythonPool(
+                size=cfg.python_pool_size,
+                max_uses=cfg.python_max_uses,
+                timeout_s=cfg.python_timeout_s,
+                memory_mb=cfg.python_memory_mb,
+                preload=cfg.python_preload,
+            )
+            atexit.register(_pool.close)
+        return _pool
+
+
+def _apply_limits(memory_mb, cpu_s):
+    import resource
+
+    limits = [
+        (resource.RLIMIT_CPU, cpu_s),
+        (resource.RLIMIT_CORE, 0),
+        (resource.RLIMIT_FSIZE, 64 * 1024 * 1024),
+    ]
+    if memory_mb:
+        limits.append((resource.RLIMIT_AS, memory_mb * 1024 * 1024))
+    for limit, value in limits:
+        resource.setrlimit(limit, (value, value))
+
+
+def _worker_main(preload, memory_mb, cpu_s):
+    # Keep the protocol on private descriptors so snippets cannot read or corrupt it.
+    requests = os.fdopen(os.dup(0), "rb")
+    replies = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    _apply_limits(memory_mb, cpu_s)
+    for name in filter(None, preload.split(",")):
+        try:
+            __import__(name)
+        except Exception:
+            pass
+
+    def reply(payload):
+        replies.write(json.dumps(payload).encode("utf-8") + b"\n")
+        replies.flush()
+
+    reply({"ready": True})
+    for line in requests:
+        code = json.loads(line)["code"]
+        stdout, stderr = io.StringIO(), io.StringIO()
+        start = time.perf_counter()
+        try:
+            sys.stdin = io.StringIO()
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                exec(compile(code, "<tool>", "exec"), {"__name__": "__main__", "__builtins__": __builtins__})
+            result = {"ok": True}
+        except SystemExit as exc:
+            result = {"ok": exc.code in (None, 0), "error": stderr.getvalue() or f"exit code {exc.code}"}
+        except BaseException as exc:
+            lines = traceback.format_exception(type(exc), exc, exc.__traceback__.tb_next)
+            result = {"ok": False, "error": stderr.getvalue() + "".join(lines)}
+        reply(dict(result, stdout=stdout.getvalue(), seconds=time.perf_counter() - start))
+
+
+if __name__ == "__main__" and sys.argv[1:2] == ["--worker"]:
+    _worker_main(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
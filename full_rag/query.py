@@ -4,12 +4,10 @@ import subprocess
 import sys
 from pathlib import Path
 
-import faiss
-import numpy as np
-from sentence_transformers import SentenceTransformer
-
 from config import default_config
-from utils import load_metadata
+from embedding import encode_queries, load_encoder
+from index_store import open_index
+from timings import collect, format_timings, pop_flag, record_child, span, strip_child
 
 
 def generate_with_llm(query, contexts):
@@ -21,37 +19,36 @@ def generate_with_llm(query, contexts):
         f"Context:\n{context_text}\n\nQuestion: {query}\nAnswer:"
     )
     script = Path(__file__).parent / "llm_generate.py"
-    result = subprocess.run(
-        [sys.executable, str(script)],
-        input=prompt,
-        text=True,
-        capture_output=True,
-    )
+    with span("llm"):
+        result = subprocess.run(
+            [sys.executable, str(script)],
+            input=prompt,
+            text=True,
+            capture_output=True,
+        )
+    record_child(result.stderr)
     if result.returncode != 0:
-        return "LLM failed: " + (result.stderr.strip() or "unknown error")
+        return "LLM failed: " + (strip_child(result.stderr).strip() or "unknown error")
     return result.stdout.strip()
 
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python query.py 'your question'")
+def run(args):
+    if not args:
+        print("Usage: python query.py [--timings] 'your question'")
         sys.exit(1)
 
     cfg = default_config()
-    if not cfg.index_path.exists() or not cfg.metadata_path.exists():
+    index = open_index(cfg)
+    if not index.loaded:
         print("Index not found. Run: python ingest.py")
         sys.exit(1)
 
-    query = " ".join(sys.argv[1:])
-    metadata = load_metadata(cfg.metadata_path)
+    query = " ".join(args)
 
-    index = faiss.read_index(str(cfg.index_path))
-    model = SentenceTransformer(cfg.embed_model_name)
-    query_vec = model.encode([query]).astype("float32")
-    faiss.normalize_L2(query_vec)
+    model = load_encoder(cfg)
+    query_vec = encode_queries(model, [query])
 
-    scores, ids = index.search(query_vec, cfg.top_k)
-    contexts = [metadata[i]["text"] for i in ids[0] if i != -1]
+    contexts = [hit["text"] for hit in index.search(query_vec, cfg.top_k)[0]]
 
     if os.environ.get("LLAMA_MODEL_PATH"):
         answer = generate_with_llm(query, contexts)
@@ -62,5 +59,13 @@ def main():
     print(answer)
 
 
+def main():
+    args, show_timings = pop_flag(sys.argv[1:])
+    with collect() as recorder:
+        run(args)
+    if show_timings:
+        print(format_timings(recorder), file=sys.stderr)
+
+
 if __name__ == "__main__":
     main()
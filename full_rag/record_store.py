@@ -0,0 +1,244 @@
+import atexit
+import fcntl
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+SEGMENT_PREFIX = "segment-"
+INDEX_FILE = "index.sqlite"
+LOCK_FILE = ".lock"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    rowid INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT UNIQUE NOT NULL,
+    case_name TEXT,
+    created_at REAL NOT NULL,
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_case_time ON records (case_name, created_at);
+CREATE INDEX IF NOT EXISTS records_time ON records (created_at);
+"""
+
+
+def new_record_id():
+    return datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ") + "-" + uuid.uuid4().hex[:8]
+
+
+class RecordStore:
+    def __init__(
+        self, root, max_segment_bytes=64 * 1024 * 1024, batch_size=64, flush_interval_s=0.2, fsync=True
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_segment_bytes = max_segment_bytes
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.fsync = fsync
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.root / INDEX_FILE), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._pending = []
+        self._pending_by_id = {}
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._writer = threading.Thread(
+            target=self._run_writer, name=f"record-store-{self.root.name}", daemon=True
+        )
+        self._writer.start()
+
+    def append(self, record):
+        record = dict(record)
+        record.setdefault("id", new_record_id())
+        record.setdefault("created_at", time.time())
+        with self._cond:
+            self._pending.append(record)
+            self._pending_by_id[record["id"]] = record
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        return record["id"]
+
+    def _run_writer(self):
+        while True:
+            with self._cond:
+                self._cond.wait(self.flush_interval_s)
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception as exc:
+                print(f"Record store flush failed for {self.root}: {exc}", file=sys.stderr)
+            if closed:
+                return
+
+    def flush(self):
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            try:
+                self._write(batch)
+            except BaseException:
+                # Appends already handed out these ids; keep them queued for the next flush.
+                with self._cond:
+                    self._pending[:0] = batch
+                raise
+            with self._cond:
+                for record in batch:
+                    self._pending_by_id.pop(record["id"], None)
+
+    def _write(self, batch):
+        lines = [
+            (record, json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n") for record in batch
+        ]
+        rows = []
+        with open(self.root / LOCK_FILE, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            segment = self._active_segment(sum(len(line) for _, line in lines))
+            with open(self._segment_path(segment), "ab") as handle:
+                offset = handle.tell()
+                handle.write(b"".join(line for _, line in lines))
+                handle.flush()
+                if self.fsync:
+                    os.fsync(handle.fileno())
+            for record, line in lines:
+                rows.append(
+                    (record["id"], record.get("case"), record["created_at"], segment, offset, len(line))
+                )
+                offset += len(line)
+            with self._db_lock, self._db:
+                self._db.executemany(
+                    "INSERT INTO records (id, case_name, created_at, segment, offset, length)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+    def _segment_path(self, segment):
+        return self.root / f"{SEGMENT_PREFIX}{segment:06d}.jsonl"
+
+    def _active_segment(self, incoming):
+        segments = sorted(self.root.glob(f"{SEGMENT_PREFIX}*.jsonl"))
+        if not segments:
+            return 1
+        last = int(segments[-1].stem[len(SEGMENT_PREFIX) :])
+        size = segments[-1].stat().st_size
+        if size and size + incoming > self.max_segment_bytes:
+            return last + 1
+        return last
+
+    def _read(self, segment, offset, length):
+        with open(self._segment_path(segment), "rb") as handle:
+            handle.seek(offset)
+            return json.loads(handle.read(length))
+
+    def _query(self, sql, params=()):
+        with self._db_lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def get(self, record_id):
+        with self._cond:
+            pending = self._pending_by_id.get(record_id)
+        if pending is not None:
+            return pending
+        rows = self._query("SELECT segment, offset, length FROM records WHERE id = ?", (record_id,))
+        return self._read(*rows[0]) if rows else None
+
+    def find(self, case=None, since=None, until=None, limit=100):
+        clauses, params = [], []
+        if case is not None:
+            clauses.append("case_name = ?")
+            params.append(case)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._query(
+            f"SELECT segment, offset, length FROM records {where} ORDER BY created_at DESC LIMIT ?",
+            (*params, limit),
+        )
+        return [self._read(*row) for row in rows]
+
+    def rowid(self, record_id):
+        rows = self._query("SELECT rowid FROM records WHERE id = ?", (record_id,))
+        return rows[0][0] if rows else None
+
+    def last_rowid(self):
+        return self._query("SELECT COALESCE(MAX(rowid), 0) FROM records")[0][0]
+
+    def ids_since(self, rowid):
+        return self._query("SELECT rowid, id FROM records WHERE rowid > ? ORDER BY rowid", (rowid,))
+
+    def iter_since(self, rowid):
+        rows = self._query(
+            "SELECT rowid, segment, offset, length FROM records WHERE rowid > ? ORDER BY rowid", (rowid,)
+        )
+        for row_id, segment, offset, length in rows:
+            yield row_id, self._read(segment, offset, length)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._writer.join()
+        try:
+            self.flush()
+        finally:
+            with self._db_lock:
+                self._db.close()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(root, cfg=None):
+    root = Path(root).resolve()
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None:
+            options = {}
+            if cfg is not None:
+                options = {
+                    "max_segment_bytes": cfg.store_segment_bytes,
+                    "batch_size": cfg.store_batch_size,
+                    "flush_interval_s": cfg.store_flush_interval_s,
+                }
+            store = _stores[root] = RecordStore(root, **options)
+        return store
+
+
+def results_store(cfg):
+    return open_store(cfg.store_dir / "results", cfg)
+
+
+def logs_store(cfg):
+    return open_store(cfg.store_dir / "logs", cfg)
+
+
+def close_stores():
+    with _stores_lock:
+        stores = list(_stores.values())
+        _stores.clear()
+    for store in stores:
+        store.close()
+
+
+@atexit.register
+def _flush_all():
+    with _stores_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        store.flush()
@@ -1,14 +1,46 @@
 #!/usr/bin/env python3
 import os
-from typing import Optional
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import List, Optional
 
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from pydantic import BaseModel
 
-from analysis_pipeline import analyze_question, plan_requirements
+from analysis_pipeline import analyze_contingency, analyze_question, plan_requirements
+from config import default_config
+from embedding import encode_queries, load_encoder
+from index_store import IndexWatcher, ShardedIndex, ingest_hook
+from power_analysis import CONTINGENCY_ELEMENTS
+from record_store import results_store
+from timings import collect, render_prometheus, span
 
-app = FastAPI()
+live_index = ShardedIndex(default_config())
+
+
+@lru_cache(maxsize=1)
+def get_model():
+    return load_encoder(live_index.cfg)
+
+
+index_result = ingest_hook(get_model, live_index)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    live_index.load()
+    watcher = None
+    if os.environ.get("NO_INDEX_WATCH") != "1":
+        watcher = IndexWatcher(live_index, get_model)
+        watcher.start()
+    yield
+    if watcher is not None:
+        watcher.stop()
+    live_index.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 class AnalyzeRequest(BaseModel):
@@ -16,13 +48,83 @@ class AnalyzeRequest(BaseModel):
     dry_run: Optional[bool] = False
 
 
+class SearchRequest(BaseModel):
+    query: str
+    top_k: Optional[int] = None
+    shards: Optional[List[str]] = None
+
+
+class ContingencyRequest(BaseModel):
+    case: str = "case14"
+    load_scale: float = 1.0
+    gen_scale: float = 1.0
+    elements: Optional[List[str]] = None
+    v_min: float = 0.95
+    v_max: float = 1.05
+    loading_limit: float = 100.0
+    top: int = 20
+
+
 @app.post("/analyze")
 def analyze(req: AnalyzeRequest):
     if not os.environ.get("LLAMA_MODEL_PATH"):
         raise HTTPException(status_code=400, detail="LLAMA_MODEL_PATH is not set")
     if req.dry_run:
-        return {"plan": plan_requirements(req.question)}
-    return analyze_question(req.question)
+        with collect() as recorder:
+            plan = plan_requirements(req.question)
+        return {"plan": plan, "timings": recorder.as_dict()}
+    return analyze_question(req.question, on_saved=index_result)
+
+
+@app.post("/contingency")
+def contingency(req: ContingencyRequest):
+    params = {"case": req.case, "load_scale": req.load_scale, "gen_scale": req.gen_scale}
+    try:
+        return analyze_contingency(
+            params,
+            question=f"N-1 contingency analysis for {req.case}",
+            elements=tuple(req.elements or CONTINGENCY_ELEMENTS),
+            top=req.top,
+            on_saved=index_result,
+            v_min=req.v_min,
+            v_max=req.v_max,
+            loading_limit=req.loading_limit,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@app.post("/search")
+def search(req: SearchRequest):
+    if not live_index.loaded:
+        raise HTTPException(status_code=503, detail="Index not found. Run: python ingest.py")
+    with collect() as recorder, span("search"):
+        query_vec = encode_queries(get_model(), [req.query])
+        try:
+            hits = live_index.search(query_vec, req.top_k or live_index.cfg.top_k, shards=req.shards)[0]
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return {"versions": live_index.versions, "hits": hits, "timings": recorder.as_dict()}
+
+
+@app.get("/results")
+def list_results(
+    case: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None, limit: int = 20
+):
+    return {"results": results_store(default_config()).find(case, since, until, limit)}
+
+
+@app.get("/results/{result_id}")
+def get_result(result_id: str):
+    record = results_store(default_config()).get(result_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Unknown result {result_id}")
+    return record
+
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/")
@@ -33,6 +135,8 @@ def root():
       <body>
         <h2>Local Power Analysis</h2>
         <p>Use POST /analyze with JSON {"question": "..."}.</p>
+        <p>Use POST /search with JSON {"query": "..."} to search the live index.</p>
+        <p>GET /metrics returns per-stage latency histograms (Prometheus format).</p>
         <p>Example:</p>
         <pre>
 curl -X POST http://127.0.0.1:8000/analyze \\
@@ -26,7 +26,8 @@ def main():
     url = f"http://{host}:{port}/"
     if os.environ.get("NO_BROWSER") != "1":
         webbrowser.open(url)
-    uvicorn.run("server:app", host=host, port=port)
+    workers = int(os.environ.get("WORKERS", "1"))
+    uvicorn.run("server:app", host=host, port=port, workers=workers)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,121 @@
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CHILD_PREFIX = "TIMINGS "
+
+_current = contextvars.ContextVar("timings", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def as_dict(self):
+        with self._lock:
+            return {stage: round(seconds, 6) for stage, seconds in self.stages.items()}
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def record(stage, seconds):
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.add(stage, seconds)
+    with _histograms_lock:
+        _histograms.setdefault(stage, Histogram()).observe(seconds)
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+@contextmanager
+def collect():
+    recorder = Recorder()
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+
+
+def record_child(stderr):
+    # Child processes (llm_generate.py) report their own stages on stderr.
+    for line in (stderr or "").splitlines():
+        if line.startswith(CHILD_PREFIX):
+            try:
+                stages = json.loads(line[len(CHILD_PREFIX) :])
+            except ValueError:
+                continue
+            for stage, seconds in stages.items():
+                record(stage, float(seconds))
+
+
+def strip_child(stderr):
+    return "\n".join(line for line in (stderr or "").splitlines() if not line.startswith(CHILD_PREFIX))
+
+
+def emit_child(stages, stream):
+    stream.write(CHILD_PREFIX + json.dumps(stages) + "\n")
+
+
+def pop_flag(argv, flag="--timings"):
+    return [arg for arg in argv if arg != flag], flag in argv
+
+
+def format_timings(recorder):
+    stages = recorder.as_dict()
+    if not stages:
+        return "Timings: (none recorded)"
+    width = max(len(stage) for stage in stages)
+    lines = ["Timings:"]
+    for stage, seconds in sorted(stages.items(), key=lambda item: -item[1]):
+        lines.append(f"  {stage:<{width}}  {seconds * 1000:10.1f} ms")
+    return "\n".join(lines)
+
+
+def render_prometheus(name="rag_stage_seconds"):
+    lines = [
+        f"# HELP {name} Time spent in each pipeline stage.",
+        f"# TYPE {name} histogram",
+    ]
+    with _histograms_lock:
+        for stage in sorted(_histograms):
+            hist = _histograms[stage]
+            for bound, count in zip(hist.buckets, hist.counts):
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {hist.count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {hist.sum}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {hist.count}')
+    return "\n".join(lines) + "\n"
@@ -1,8 +1,11 @@
 import json
+import os
 import re
 from dataclasses import asdict
 from pathlib import Path
-from typing import Iterable, List, Union
+from typing import Iterable, List, Tuple, Union
+
+import numpy as np
 
 
 def _iter_dirs(data_dirs: Union[Path, Iterable[Path]]):
@@ -11,34 +14,127 @@ def _iter_dirs(data_dirs: Union[Path, Iterable[Path]]):
     return list(data_dirs)
 
 
-def load_texts(data_dirs: Union[Path, Iterable[Path]]):
-    docs = []
+def iter_source_files(data_dirs: Union[Path, Iterable[Path]]):
     for data_dir in _iter_dirs(data_dirs):
         if not data_dir.exists():
             continue
-        for path in sorted(data_dir.glob("*.md")):
-            docs.append((path.name, path.read_text(encoding="utf-8")))
-        for path in sorted(data_dir.glob("*.txt")):
-            docs.append((path.name, path.read_text(encoding="utf-8")))
-    return docs
+        yield from sorted(data_dir.glob("*.md"))
+        yield from sorted(data_dir.glob("*.txt"))
 
 
-def chunk_text(text: str, chunk_size: int, overlap: int) -> List[str]:
-    words = re.findall(r"\S+", text)
-    chunks = []
+def load_texts(data_dirs: Union[Path, Iterable[Path]]):
+    return [
+        (path.name, path.read_text(encoding="utf-8"))
+        for path in iter_source_files(data_dirs)
+    ]
+
+
+def chunk_spans(text: str, chunk_size: int, overlap: int) -> List[Tuple[int, int]]:
+    words = [match.span() for match in re.finditer(r"\S+", text)]
+    spans = []
     start = 0
     while start < len(words):
         end = min(len(words), start + chunk_size)
-        chunk = " ".join(words[start:end])
-        chunks.append(chunk)
+        spans.append((words[start][0], words[end - 1][1]))
         if end == len(words):
             break
         start = max(0, end - overlap)
-    return chunks
+    return spans
+
+
+def chunk_text(text: str, chunk_size: int, overlap: int) -> List[str]:
+    return [" ".join(text[start:end].split()) for start, end in chunk_spans(text, chunk_size, overlap)]
+
+
+SENTENCE_BREAK = re.compile(r"[。！？]+[」』）]*|[.!?]+[\"')\]]*(?=\s|$)|\n")
+CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef"
+TOKEN_PATTERN = re.compile(rf"[{CJK}]|[^\W{CJK}]+|[^\w\s]")
+
+
+def regex_token_offsets(texts: List[str]) -> List[List[Tuple[int, int]]]:
+    # Stand-in for tokenizers without offset mappings: one token per word, CJK character or symbol.
+    return [[match.span() for match in TOKEN_PATTERN.finditer(text)] for text in texts]
+
+
+def sentence_ends(text: str) -> List[int]:
+    ends = [match.end() for match in SENTENCE_BREAK.finditer(text)]
+    if not ends or ends[-1] != len(text):
+        ends.append(len(text))
+    return ends
+
+
+def pack_token_spans(text: str, offsets, max_tokens: int, overlap: int) -> List[Tuple[int, int]]:
+    offsets = np.asarray(offsets, dtype="int64").reshape(-1, 2)
+    if not len(offsets):
+        return []
+    # Token index just past each sentence; the last one is always len(offsets).
+    bounds = np.unique(np.searchsorted(offsets[:, 0], sentence_ends(text), side="left"))
+    bounds = bounds[bounds > 0]
+    spans = []
+    start = 0
+    while True:
+        first = int(np.searchsorted(bounds, start, side="right"))
+        last = int(np.searchsorted(bounds, start + max_tokens, side="right")) - 1
+        # Whole sentences, unless that would leave a short chunk before a long sentence.
+        if last >= first and (bounds[last] - start >= max_tokens // 2 or bounds[last] == len(offsets)):
+            # The next chunk repeats the trailing sentences that fit in the overlap.
+            end = int(bounds[last])
+            tail = max(first, int(np.searchsorted(bounds, end - overlap, side="left")))
+            following = int(bounds[tail]) if tail < last else end
+        else:
+            # Cut at a token boundary inside the long sentence, overlapping by tokens; what is left
+            # of it packs together with the sentences after it.
+            end = min(start + max_tokens, len(offsets))
+            following = max(start + 1, end - overlap)
+        spans.append((int(offsets[start, 0]), int(offsets[end - 1, 1])))
+        if end >= len(offsets):
+            return spans
+        start = following
+
+
+def iter_token_chunks(documents, token_offsets, max_tokens: int, overlap: int, batch_size: int = 32):
+    # documents: iterable of (key, text); yields (key, text, spans) in order, tokenizing batch_size at a time.
+    batch = []
+    for key, text in documents:
+        batch.append((key, text))
+        if len(batch) == batch_size:
+            yield from _chunk_batch(batch, token_offsets, max_tokens, overlap)
+            batch = []
+    if batch:
+        yield from _chunk_batch(batch, token_offsets, max_tokens, overlap)
+
+
+def _chunk_batch(batch, token_offsets, max_tokens, overlap):
+    offsets = token_offsets([text for _, text in batch])
+    for (key, text), doc_offsets in zip(batch, offsets):
+        yield key, text, pack_token_spans(text, doc_offsets, max_tokens, overlap)
+
+
+def iter_word_chunks(documents, chunk_size: int, overlap: int):
+    for key, text in documents:
+        yield key, text, chunk_spans(text, chunk_size, overlap)
+
+
+def byte_offsets(text: str, positions: Iterable[int]) -> List[int]:
+    # Character positions (ascending) to UTF-8 byte offsets in one pass.
+    offsets = []
+    previous = 0
+    total = 0
+    for position in positions:
+        total += len(text[previous:position].encode("utf-8"))
+        previous = position
+        offsets.append(total)
+    return offsets
+
+
+def write_text_atomic(path: Path, text: str):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
 
 
 def save_metadata(path: Path, metadata):
-    path.write_text(json.dumps(metadata, indent=2), encoding="utf-8")
+    write_text_atomic(path, json.dumps(metadata, indent=2))
 
 
 def load_metadata(path: Path):